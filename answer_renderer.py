@@ -0,0 +1,90 @@
+#deterministic answers for simple result shapes, skipping the final LLM call
+#scalar, single row, short single-column list, empty result and DML row counts
+#anything more complex (multi-column, multi-row results, errors) still goes to the LLM
+
+import os
+import threading
+from collections import Counter
+from sql_text import is_read
+
+
+LOCAL_ANSWERS_ENABLED = os.environ.get("LOCAL_ANSWERS", "1") != "0"
+SHORT_LIST_MAX = int(os.environ.get("LOCAL_ANSWERS_SHORT_LIST_MAX", "20"))
+
+
+def sql_kind(sql):
+    return "select" if is_read(sql) else "write"
+
+
+def format_value(value):
+    if value is None:
+        return "none"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else str(value)
+    return str(value)
+
+
+def label(column):
+    return column.replace("_", " ")
+
+
+#(shape, answer) or None when the result needs the LLM
+def render_answer(state):
+    if state.get("sql_error"):
+        return None
+    rows = state.get("query_rows") or []
+    kind = sql_kind(state.get("sql_query", ""))
+
+    if kind == "write" and not rows:
+        affected = state.get("rows_affected")
+        if affected is None or affected < 0:
+            return "dml", "The requested action has been completed successfully."
+        noun = "row" if affected == 1 else "rows"
+        return "dml", f"The requested action has been completed successfully ({affected} {noun} affected)."
+
+    if not rows:
+        return "empty", "No results were found for this query."
+
+    columns = list(rows[0].keys())
+    if len(rows) == 1 and len(columns) == 1:
+        return "scalar", f"The {label(columns[0])} is {format_value(rows[0][columns[0]])}."
+
+    if len(rows) == 1:
+        details = ", ".join(f"{label(column)}: {format_value(rows[0][column])}" for column in columns)
+        return "single_row", f"Here is the result: {details}."
+
+    if len(columns) == 1 and len(rows) <= SHORT_LIST_MAX:
+        values = ", ".join(format_value(row[columns[0]]) for row in rows)
+        return "short_list", f"Found {len(rows)} {label(columns[0])} values: {values}."
+
+    return None
+
+
+class RendererStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.shapes = Counter()
+
+    def record(self, shape):
+        with self._lock:
+            self.shapes[shape] += 1
+
+    def snapshot(self):
+        with self._lock:
+            local = sum(count for shape, count in self.shapes.items() if shape != "llm")
+            total = local + self.shapes["llm"]
+            return {
+                "by_shape": dict(self.shapes),
+                "llm_calls_saved": local,
+                "llm_calls_saved_rate": local / total if total else 0.0,
+            }
+
+
+renderer_stats = RendererStats()
+
+
+def try_render_answer(state):
+    rendered = render_answer(state) if LOCAL_ANSWERS_ENABLED else None
+    renderer_stats.record(rendered[0] if rendered else "llm")
+    return rendered
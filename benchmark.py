@@ -0,0 +1,236 @@
+#offline end-to-end benchmark: the compiled graph against a scripted fake chat model, no network
+#runs the labeled corpus (relevant, irrelevant, failing, write) at several database sizes and
+#concurrency levels and reports latency percentiles, questions/sec, LLM calls per question and SQL time
+#--advise adds the index advisor's recommendations per size, with the speedup measured on the replayed workload
+#python benchmark.py --sizes 100,10000 --concurrency 1,8 --output benchmark_results.json
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")    #never used, the fake model replaces every client
+
+from corpus import BENCHMARK_KINDS, BENCHMARK_QUESTIONS
+from fake_llm import FakeLLM, FakeScript
+from index_advisor import advise
+from llm_registry import configure_llms
+from metrics import metrics
+from result_cache import data_version, result_cache
+from runner import arun_query
+from sql_connection import configure_database
+from synthetic_db import generate_database
+from translation_cache import translation_cache
+from user_context import invalidate_users
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def latency_summary(values):
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+#one synthetic database per size and seed, generated once and never opened by the graph,
+#the runs work on a copy that restore_database() resets to it
+def benchmark_database(workdir, users, seed=0):
+    path = os.path.join(workdir, f"benchmark_{users}_{seed}.db")
+    if not os.path.exists(path):
+        generate_database(path, users, seed=seed)
+    return path, os.path.join(workdir, f"run_{users}_{seed}.db")
+
+
+#the corpus writes change the data, so every pass starts from the generated file again
+#(SQLite backup API, the engine's pooled connections stay valid)
+def restore_database(engine, template):
+    source = sqlite3.connect(template)
+    connection = engine.raw_connection()
+    try:
+        source.backup(connection.driver_connection)
+    finally:
+        connection.close()
+        source.close()
+    data_version(engine).bump()
+
+
+#caches and counters are cleared so every run starts cold
+def reset_run(fake):
+    translation_cache.clear()
+    result_cache.clear()
+    invalidate_users()
+    metrics.reset()
+    fake.reset()
+
+
+async def timed_query(semaphore, question, kind, mode, recovery):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            state = await arun_query(question, mode=mode, recovery=recovery)
+            error = "sql_error" if state.get("sql_error") else None
+            attempts = state.get("attempts", 0)
+        except Exception as e:
+            error = type(e).__name__
+            attempts = None
+        return {"kind": kind, "seconds": time.perf_counter() - start, "error": error, "attempts": attempts}
+
+
+def sql_seconds(snapshot):
+    series = snapshot["histograms"].get("sql_seconds", [])
+    count = sum(entry["count"] for entry in series)
+    total = sum(entry["sum"] for entry in series)
+    return {"statements": count, "total": total, "mean": total / count if count else 0.0}
+
+
+async def run_level(fake, engine, template, questions, concurrency, repeat=1, mode=None, recovery=None):
+    reset_run(fake)
+    results = []
+    elapsed = 0.0
+    for _ in range(repeat):
+        restore_database(engine, template)
+        semaphore = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        results += await asyncio.gather(
+            *(timed_query(semaphore, question, kind, mode, recovery) for question, kind, _ in questions)
+        )
+        elapsed += time.perf_counter() - start
+
+    by_kind = {}
+    for kind in BENCHMARK_KINDS:
+        latencies = [result["seconds"] for result in results if result["kind"] == kind]
+        if latencies:
+            by_kind[kind] = latency_summary(latencies)
+    attempts = [result["attempts"] for result in results if result["attempts"] is not None]
+    return {
+        "concurrency": concurrency,
+        "questions": len(results),
+        "seconds": elapsed,
+        "questions_per_second": len(results) / elapsed if elapsed else 0.0,
+        "latency": latency_summary([result["seconds"] for result in results]),
+        "latency_by_kind": by_kind,
+        "llm_calls_per_question": fake.total_calls() / len(results) if results else 0.0,
+        "llm_calls": {f"{role}:{kind}": count for (role, kind), count in sorted(fake.calls.items())},
+        "average_attempts": sum(attempts) / len(attempts) if attempts else 0.0,
+        "sql": sql_seconds(metrics.snapshot()),
+        "errors": dict(Counter(result["error"] for result in results if result["error"])),
+    }
+
+
+def run_benchmark(sizes, concurrency_levels, repeat=1, latency=0.05, jitter=0.0, seed=0, workdir=".", mode=None, recovery=None, caches=False, advise_indexes=False):
+    fake = FakeLLM(FakeScript.from_corpus(BENCHMARK_QUESTIONS), latency=latency, jitter=jitter, seed=seed)
+    configure_llms(factory=fake.factory, llm_cache=None)
+
+    #repeated questions would otherwise be answered from the caches instead of the graph
+    cache_sizes = (translation_cache.max_entries, result_cache.max_entries)
+    if not caches:
+        translation_cache.max_entries = result_cache.max_entries = 0
+
+    runs = []
+    advice = []
+    try:
+        for users in sizes:
+            template, run_path = benchmark_database(workdir, users, seed)
+            engine = configure_database(f"sqlite:///{run_path}")
+            for concurrency in concurrency_levels:
+                run = asyncio.run(run_level(fake, engine, template, BENCHMARK_QUESTIONS, concurrency, repeat, mode, recovery))
+                run["db_users"] = users
+                runs.append(run)
+                print(
+                    f"users={users:<9} concurrency={concurrency:<4} "
+                    f"qps={run['questions_per_second']:7.2f} p50={run['latency']['p50']:.3f}s "
+                    f"p95={run['latency']['p95']:.3f}s p99={run['latency']['p99']:.3f}s "
+                    f"llm/q={run['llm_calls_per_question']:.2f} sql={run['sql']['total']:.3f}s "
+                    f"errors={sum(run['errors'].values())}",
+                    file=sys.__stdout__,
+                )
+            if advise_indexes:
+                #indexes are created only for the measurement and dropped again
+                restore_database(engine, template)
+                report = advise(engine, measure=True)
+                report["db_users"] = users
+                advice.append(report)
+                for recommendation in report["recommendations"]:
+                    print(
+                        f"users={users:<9} {recommendation['index']}: "
+                        f"estimated {recommendation['estimated_speedup']:.1f}x, "
+                        f"measured {recommendation['measured_speedup'] or 0:.1f}x",
+                        file=sys.__stdout__,
+                    )
+    finally:
+        translation_cache.max_entries, result_cache.max_entries = cache_sizes
+
+    return {
+        "config": {
+            "sizes": list(sizes),
+            "concurrency": list(concurrency_levels),
+            "repeat": repeat,
+            "latency": latency,
+            "jitter": jitter,
+            "seed": seed,
+            "mode": mode,
+            "recovery": recovery,
+            "caches": caches,
+            "advise_indexes": advise_indexes,
+            "corpus": Counter(kind for _, kind, _ in BENCHMARK_QUESTIONS),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "runs": runs,
+        "index_advice": advice,
+    }
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the SQL agent graph.")
+    parser.add_argument("--sizes", type=int_list, default=[100, 10000], help="comma-separated user counts")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8], help="comma-separated concurrency levels")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus per run, each on fresh data")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per fake LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default=None, help="graph mode, defaults to GRAPH_MODE")
+    parser.add_argument("--recovery", action="store_true", default=None, help="parallel candidate recovery")
+    parser.add_argument("--caches", action="store_true", help="keep the translation and result caches enabled")
+    parser.add_argument("--advise", action="store_true", help="recommend indexes and measure them on the recorded workload")
+    parser.add_argument("--workdir", default="benchmark_data", help="directory for the generated databases")
+    parser.add_argument("--output", default="benchmark_results.json", help="results JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the graph's progress output")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        results = run_benchmark(
+            args.sizes, args.concurrency, args.repeat, args.latency, args.jitter, args.seed,
+            args.workdir, args.mode, args.recovery, args.caches, args.advise,
+        )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#labeled questions against the demo schema (users, food, orders)
+#used to benchmark the local fast paths without calling the LLM
+
+#(question, relevance label)
+LABELED_QUESTIONS = [
+    ("Show me all users", "relevant"),
+    ("What food items are available?", "relevant"),
+    ("What has Alice ordered?", "relevant"),
+    ("How much does Pizza Margherita cost?", "relevant"),
+    ("How old is Bob?", "relevant"),
+    ("What is Charlie's email address?", "relevant"),
+    ("List all orders", "relevant"),
+    ("How many orders are there?", "relevant"),
+    ("Which user placed the most orders?", "relevant"),
+    ("What is the most expensive food?", "relevant"),
+    ("Add an order of Lasagne for Bob", "relevant"),
+    ("Create a new user named Dana aged 28 with email dana@example.com", "relevant"),
+    ("What is the average price of the menu?", "relevant"),
+    ("Show me the tables in the database", "relevant"),
+    ("Who ordered Spaghetti Carbonara?", "relevant"),
+    ("What did I order?", "relevant"),
+    ("How many people are registered?", "relevant"),
+    ("Delete my last order", "relevant"),
+    ("What's the weather like today?", "not_relevant"),
+    ("Tell me a joke", "not_relevant"),
+    ("Who won the world cup in 2018?", "not_relevant"),
+    ("What is the capital of France?", "not_relevant"),
+    ("Write a poem about the ocean", "not_relevant"),
+    ("How do I change a flat tire?", "not_relevant"),
+    ("What is the meaning of life?", "not_relevant"),
+    ("Translate hello into Spanish", "not_relevant"),
+    ("Recommend a good movie for tonight", "not_relevant"),
+    ("Give me a pizza recipe", "not_relevant"),
+]
+
+
+#end-to-end benchmark corpus: (question, kind, scripted SQL for the fake LLM)
+#kinds: "relevant" answered from a SELECT, "irrelevant" ends in the funny response,
+#"failing" keeps producing invalid SQL until the attempts cap, "write" changes data
+#the SQL only relies on the demo schema, so it runs against synthetic databases of any size
+BENCHMARK_KINDS = ("relevant", "irrelevant", "failing", "write")
+
+BENCHMARK_QUESTIONS = [
+    ("How many orders are there?", "relevant", "SELECT COUNT(*) AS order_count FROM orders"),
+    ("Show me all users", "relevant", "SELECT * FROM users"),
+    ("What is the average price of the menu?", "relevant", "SELECT AVG(price) AS average_price FROM food"),
+    ("What is the most expensive food?", "relevant", "SELECT name, price FROM food ORDER BY price DESC LIMIT 1"),
+    ("How many users are older than 40?", "relevant", "SELECT COUNT(*) AS user_count FROM users WHERE age > 40"),
+    (
+        "Which user placed the most orders?",
+        "relevant",
+        "SELECT users.name, COUNT(orders.id) AS order_count FROM users "
+        "JOIN orders ON orders.user_id = users.id GROUP BY users.id ORDER BY order_count DESC LIMIT 1",
+    ),
+    (
+        "What are the five most ordered foods?",
+        "relevant",
+        "SELECT food.name AS food_name, COUNT(*) AS times_ordered FROM orders "
+        "JOIN food ON food.id = orders.food_id GROUP BY food.id ORDER BY times_ordered DESC LIMIT 5",
+    ),
+    (
+        "How much revenue did all orders bring in?",
+        "relevant",
+        "SELECT SUM(food.price) AS revenue FROM orders JOIN food ON food.id = orders.food_id",
+    ),
+    (
+        "What did the user with id 1 order?",
+        "relevant",
+        "SELECT food.name AS food_name, food.price FROM orders JOIN food ON food.id = orders.food_id WHERE orders.user_id = 1",
+    ),
+    ("What is the weather like today?", "irrelevant", ""),
+    ("Tell me a joke about cats", "irrelevant", ""),
+    ("Who won the football world cup in 2014?", "irrelevant", ""),
+    ("Which users have a gold loyalty tier?", "failing", "SELECT name FROM users WHERE loyalty_tier = 'gold'"),
+    ("List the delivery address of every order", "failing", "SELECT orders.address FROM orders"),
+    (
+        "Add an order of the cheapest food for the user with id 1",
+        "write",
+        "INSERT INTO orders (food_id, user_id) SELECT id, 1 FROM food ORDER BY price LIMIT 1",
+    ),
+    ("Register a new user named Dana who is 28", "write", "INSERT INTO users (name, age) VALUES ('Dana', 28)"),
+]
@@ -0,0 +1,143 @@
+#deterministic local chat model for offline runs and benchmarks
+#answers come from a script keyed by the normalized question, every call sleeps a configurable latency
+#plugs into the LLM registry as a factory: configure_llms(factory=FakeLLM(script).factory)
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from translation_cache import normalize_question
+
+
+FEEDBACK_MARKER = "\n\nThe previous SQL query failed."
+
+
+#(question text, has error feedback) from the last human message of any graph prompt
+def parse_question(content):
+    feedback = FEEDBACK_MARKER in content
+    text = content.split(FEEDBACK_MARKER)[0]
+    match = re.search(r"(?:Original )?Question: (.*)", text, re.S)
+    question = match.group(1) if match else text
+    return question.split("\nReformulate")[0].strip(), feedback
+
+
+class FakeScript:
+
+    def __init__(self, entries=None, default_sql="SELECT 1"):
+        #normalized question -> {"relevance": ..., "sql": ..., "retry_sql": ...}
+        self.entries = {}
+        self.default_sql = default_sql
+        for question, entry in (entries or {}).items():
+            self.add(question, **entry)
+
+    def add(self, question, relevance="relevant", sql="", retry_sql=None):
+        self.entries[normalize_question(question)] = {"relevance": relevance, "sql": sql, "retry_sql": retry_sql}
+
+    #script from corpus.BENCHMARK_QUESTIONS style (question, kind, sql) rows
+    @classmethod
+    def from_corpus(cls, questions):
+        script = cls()
+        for question, kind, sql in questions:
+            script.add(question, "not_relevant" if kind == "irrelevant" else "relevant", sql)
+        return script
+
+    def lookup(self, question):
+        return self.entries.get(normalize_question(question), {"relevance": "relevant", "sql": self.default_sql, "retry_sql": None})
+
+    def respond(self, schema_name, question, feedback):
+        entry = self.lookup(question)
+        sql = entry["retry_sql"] if feedback and entry["retry_sql"] else entry["sql"]
+        if schema_name == "CheckRelevance":
+            return {"relevance": entry["relevance"]}
+        if schema_name == "ConvertToSQL":
+            return {"sql_query": sql}
+        if schema_name == "CheckRelevanceAndConvertToSQL":
+            return {"relevance": entry["relevance"], "sql_query": sql if entry["relevance"] == "relevant" else ""}
+        if schema_name == "RewrittenQuestion":
+            #the rewrite keeps the wording so the script still matches on the next attempt
+            return {"question": question}
+        raise ValueError(f"FakeScript has no response for schema '{schema_name}'.")
+
+
+class FakeChatModel(BaseChatModel):
+    role: str = "default"
+    llm: Any = None     #the owning FakeLLM (script, latency, counters)
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _respond(self, messages, structured_schema=None):
+        content = messages[-1].content
+        if structured_schema is not None:
+            question, feedback = parse_question(content)
+            text = json.dumps(self.llm.script.respond(structured_schema, question, feedback))
+        elif self.role == "funny":
+            text = "That question is outside my menu, but I can tell you what everyone is ordering."
+        else:
+            text = "Here is what the database returned for your question."
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4 + 1
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": len(text) // 4 + 1,
+                "total_tokens": prompt_tokens + len(text) // 4 + 1,
+            },
+        )
+        self.llm.record(self.role, structured_schema)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, structured_schema=None, **kwargs):
+        time.sleep(self.llm.delay())
+        return self._respond(messages, structured_schema)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, structured_schema=None, **kwargs):
+        await asyncio.sleep(self.llm.delay())
+        return self._respond(messages, structured_schema)
+
+    #the structured call still goes through the chat model, so callbacks and metrics see it
+    def with_structured_output(self, schema, **kwargs):
+        parse = RunnableLambda(lambda message: schema.model_validate_json(message.content))
+        return self.bind(structured_schema=schema.__name__) | parse
+
+
+class FakeLLM:
+
+    def __init__(self, script=None, latency=0.0, jitter=0.0, seed=0):
+        self.script = script or FakeScript()
+        self.latency = latency      #seconds per call
+        self.jitter = jitter        #extra uniform 0..jitter seconds, reproducible from the seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()      #(role, kind) -> count
+
+    def delay(self):
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def record(self, role, structured_schema):
+        with self._lock:
+            self.calls[(role, structured_schema or "text")] += 1
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    #LLM registry factory signature: (role, temperature) -> chat model
+    def factory(self, role, temperature):
+        return FakeChatModel(role=role, llm=self)
@@ -1,66 +1,194 @@
+import os
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
 from states import AgentState
+from recovery import RECOVERY_MODE
+from metrics import instrument, ainstrument
+from profile import get_current_user, aget_current_user
 from tools import (
-    get_current_user,
+    lookup_translation,
+    match_template,
     check_relevance,
+    acheck_relevance,
+    check_relevance_and_convert,
+    acheck_relevance_and_convert,
+    speculate_relevance_and_sql,
+    aspeculate_relevance_and_sql,
     convert_nl_to_sql,
+    aconvert_nl_to_sql,
+    validate_sql,
+    avalidate_sql,
     execute_sql,
+    aexecute_sql,
+    condense_results,
     generate_human_readable_answer,
+    agenerate_human_readable_answer,
     regenerate_query,
+    aregenerate_query,
+    recover_sql,
+    arecover_sql,
     generate_funny_response,
+    agenerate_funny_response,
     end_max_iterations,
+    translation_cache_router,
+    template_router,
     relevance_router,
+    fused_router,
+    validate_sql_router,
+    recovery_router,
     execute_sql_router,
     check_attempts_router,
 )
 
-workflow = StateGraph(AgentState)
-# Rest of the code remains unchanged
 
-workflow.add_node("get_current_user", get_current_user)
-workflow.add_node("check_relevance", check_relevance)
-workflow.add_node("convert_to_sql", convert_nl_to_sql)
-workflow.add_node("execute_sql", execute_sql)
-workflow.add_node("generate_human_readable_answer", generate_human_readable_answer)
-workflow.add_node("regenerate_query", regenerate_query)
-workflow.add_node("generate_funny_response", generate_funny_response)
-workflow.add_node("end_max_iterations", end_max_iterations)
+#sync + async implementation of a node, app.invoke uses the first and app.ainvoke the second
+#both are timed into the node_seconds histogram, nodes without an async version run the sync one in a thread
+def node(func, afunc=None):
+    name = func.__name__
+    return RunnableLambda(instrument(name, func), afunc=ainstrument(name, afunc) if afunc else None, name=name)
 
-workflow.add_edge("get_current_user", "check_relevance")
 
-workflow.add_conditional_edges(
-    "check_relevance",
-    relevance_router,
-    {
-        "convert_to_sql": "convert_to_sql",
-        "generate_funny_response": "generate_funny_response",
-    },
-)
+#"sequential": check_relevance then convert_to_sql (two LLM calls)
+#"fused": one structured call returns both the relevance verdict and the SQL
+#"speculative": relevance check and SQL generation run concurrently, the SQL is dropped if not relevant
+GRAPH_MODES = ("sequential", "fused", "speculative")
+GRAPH_MODE = os.environ.get("GRAPH_MODE", "sequential")
 
-workflow.add_edge("convert_to_sql", "execute_sql")
 
-workflow.add_conditional_edges(
-    "execute_sql",
-    execute_sql_router,
-    {
-        "generate_human_readable_answer": "generate_human_readable_answer",
-        "regenerate_query": "regenerate_query",
-    },
-)
+#recovery=True replaces regenerate_query -> convert_to_sql with parallel candidates (recover_sql)
+def build_workflow(mode=GRAPH_MODE, recovery=RECOVERY_MODE):
+    if mode not in GRAPH_MODES:
+        raise ValueError(f"Unknown graph mode '{mode}'. Expected one of {GRAPH_MODES}.")
 
-workflow.add_conditional_edges(
-    "regenerate_query",
-    check_attempts_router,
-    {
-        "convert_to_sql": "convert_to_sql",
-        "max_iterations": "end_max_iterations",
-    },
-)
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("get_current_user", node(get_current_user, aget_current_user))
+    workflow.add_node("lookup_translation", node(lookup_translation))
+    workflow.add_node("match_template", node(match_template))
+    workflow.add_node("convert_to_sql", node(convert_nl_to_sql, aconvert_nl_to_sql))
+    workflow.add_node("validate_sql", node(validate_sql, avalidate_sql))
+    workflow.add_node("execute_sql", node(execute_sql, aexecute_sql))
+    workflow.add_node("condense_results", node(condense_results))
+    workflow.add_node("generate_human_readable_answer", node(generate_human_readable_answer, agenerate_human_readable_answer))
+    if recovery:
+        retry_node = "recover_sql"
+        workflow.add_node(retry_node, node(recover_sql, arecover_sql))
+    else:
+        retry_node = "regenerate_query"
+        workflow.add_node(retry_node, node(regenerate_query, aregenerate_query))
+    workflow.add_node("generate_funny_response", node(generate_funny_response, agenerate_funny_response))
+    workflow.add_node("end_max_iterations", node(end_max_iterations))
+
+    if mode in ("fused", "speculative"):
+        if mode == "fused":
+            relevance_node = "check_relevance_and_convert"
+            workflow.add_node(relevance_node, node(check_relevance_and_convert, acheck_relevance_and_convert))
+        else:
+            relevance_node = "speculate_relevance_and_sql"
+            workflow.add_node(relevance_node, node(speculate_relevance_and_sql, aspeculate_relevance_and_sql))
+        #both produce a verdict and the SQL in one step
+        workflow.add_conditional_edges(
+            relevance_node,
+            fused_router,
+            {
+                "execute_sql": "validate_sql",
+                "convert_to_sql": "convert_to_sql",
+                "generate_funny_response": "generate_funny_response",
+            },
+        )
+    else:
+        relevance_node = "check_relevance"
+        workflow.add_node(relevance_node, node(check_relevance, acheck_relevance))
+        workflow.add_conditional_edges(
+            relevance_node,
+            relevance_router,
+            {
+                "convert_to_sql": "convert_to_sql",
+                "generate_funny_response": "generate_funny_response",
+            },
+        )
+
+    workflow.add_edge("get_current_user", "lookup_translation")
+
+    workflow.add_conditional_edges(
+        "lookup_translation",
+        translation_cache_router,
+        {
+            "match_template": "match_template",
+            "execute_sql": "execute_sql",
+            "generate_funny_response": "generate_funny_response",
+        },
+    )
+
+    workflow.add_conditional_edges(
+        "match_template",
+        template_router,
+        {
+            "check_relevance": relevance_node,
+            "execute_sql": "execute_sql",
+        },
+    )
+
+    #generated SQL is validated first, cached translations and templates already ran successfully
+    workflow.add_edge("convert_to_sql", "validate_sql")
+
+    workflow.add_conditional_edges(
+        "validate_sql",
+        validate_sql_router,
+        {
+            "execute_sql": "execute_sql",
+            "regenerate_query": retry_node,
+        },
+    )
+
+    workflow.add_conditional_edges(
+        "execute_sql",
+        execute_sql_router,
+        {
+            "condense_results": "condense_results",
+            "regenerate_query": retry_node,
+        },
+    )
+
+    workflow.add_edge("condense_results", "generate_human_readable_answer")
+
+    if recovery:
+        workflow.add_conditional_edges(
+            retry_node,
+            recovery_router,
+            {
+                "execute_sql": "execute_sql",
+                "convert_to_sql": retry_node,
+                "end_max_iterations": "end_max_iterations",
+            },
+        )
+    else:
+        workflow.add_conditional_edges(
+            retry_node,
+            check_attempts_router,
+            {
+                "convert_to_sql": "convert_to_sql",
+                "end_max_iterations": "end_max_iterations",
+            },
+        )
+
+    workflow.add_edge("generate_human_readable_answer", END)
+    workflow.add_edge("generate_funny_response", END)
+    workflow.add_edge("end_max_iterations", END)
+
+    workflow.set_entry_point("get_current_user")
+    return workflow
+
+
+workflow = build_workflow(GRAPH_MODE, RECOVERY_MODE)
+app = workflow.compile()
 
-workflow.add_edge("generate_human_readable_answer", END)
-workflow.add_edge("generate_funny_response", END)
-workflow.add_edge("end_max_iterations", END)
+#compiled graphs per (mode, recovery), the default one is shared with app
+_apps = {(GRAPH_MODE, RECOVERY_MODE): app}
 
-workflow.set_entry_point("get_current_user")
 
-app = workflow.compile()
\ No newline at end of file
+def get_app(mode=None, recovery=None):
+    key = (mode or GRAPH_MODE, RECOVERY_MODE if recovery is None else recovery)
+    if key not in _apps:
+        _apps[key] = build_workflow(*key).compile()
+    return _apps[key]
@@ -0,0 +1,462 @@
+#workload-driven index advisor
+#execute_sql records every read it runs (SELECT and WITH ... SELECT): the normalized statement shape
+#(literals replaced by ?), call count, timings and the EXPLAIN QUERY PLAN captured the first time the shape is seen
+#recommend() turns full scans and SQLite's per-query automatic indexes on equality / join columns into
+#single-column CREATE INDEX suggestions with a rows-touched estimate, evaluate() replays the recorded
+#SELECTs before and after each index to measure the real speedup
+#INDEX_ADVISOR_AUTO_APPLY=1 creates a recommended index once a shape needing it ran INDEX_ADVISOR_MIN_CALLS times
+#python index_advisor.py --database sqlite:///synthetic.db --workload workload.json
+
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from metrics import log
+from query_guard import query_plan
+from schema_catalog import get_schema
+from sql_connection import configure_database, get_engine, get_read_engine
+from sql_text import tokenize_sql, is_read
+from sql_validator import table_references
+
+
+ADVISOR_ENABLED = os.environ.get("INDEX_ADVISOR", "1") != "0"
+AUTO_APPLY = os.environ.get("INDEX_ADVISOR_AUTO_APPLY", "0") == "1"
+MIN_CALLS = int(os.environ.get("INDEX_ADVISOR_MIN_CALLS", "3"))
+MAX_SHAPES = int(os.environ.get("INDEX_ADVISOR_MAX_SHAPES", "1000"))
+#fixed cost of running any statement (parse, plan, driver round trip) in rows touched, bounds the estimates
+STATEMENT_OVERHEAD_ROWS = 2000
+
+SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+AUTOMATIC_PATTERN = re.compile(r"^SEARCH (?:TABLE )?(\w+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \(([^)]*)\)")
+
+
+#statement with literals replaced by ? and unquoted words lowercased, so repeated questions share a shape
+def sql_shape(stmt):
+    pieces = []
+    for kind, value in tokenize_sql(stmt):
+        if kind in ("string", "number"):
+            pieces.append("?")
+        elif kind == "word":
+            pieces.append(value.lower())
+        else:
+            pieces.append(value)
+    return " ".join(pieces)
+
+
+def alias_map(tokens):
+    tables, _ = table_references(tokens)
+    resolve = {}
+    for name, aliases in tables.items():
+        resolve[name] = name
+        for alias in aliases:
+            resolve[alias] = name
+    return resolve
+
+
+#(table, column) -> "filter" (compared with a literal or parameter, or IN) or "join" (compared with
+#another column), unqualified columns are matched against the schema
+def equality_columns(tokens, resolve, snapshot):
+    def column_at(index, step):
+        #column reference ending (step=-1) or starting (step=1) next to the operator
+        if step < 0:
+            if index < 0 or tokens[index][0] != "word":
+                return None
+            if index >= 2 and tokens[index - 1][1] == "." and tokens[index - 2][0] == "word":
+                return tokens[index - 2][1].lower(), tokens[index][1].lower()
+            return None, tokens[index][1].lower()
+        if index >= len(tokens) or tokens[index][0] != "word":
+            return None
+        if index + 2 < len(tokens) and tokens[index + 1][1] == "." and tokens[index + 2][0] == "word":
+            return tokens[index][1].lower(), tokens[index + 2][1].lower()
+        return None, tokens[index][1].lower()
+
+    def is_value(index):
+        return 0 <= index < len(tokens) and (tokens[index][0] in ("string", "number") or tokens[index][1] in (":", "?"))
+
+    references = []     #(reference, kind)
+    for index, (kind, value) in enumerate(tokens):
+        if kind == "symbol" and value == "=" and (index == 0 or tokens[index - 1][1] not in "<>!"):
+            left, right = column_at(index - 1, -1), column_at(index + 1, 1)
+            references.append((left, "filter" if is_value(index + 1) else "join"))
+            references.append((right, "filter" if is_value(index - 1) else "join"))
+        elif kind == "word" and value.lower() == "in":
+            references.append((column_at(index - 1, -1), "filter"))
+
+    columns = {}
+    for reference, usage in references:
+        if reference is None:
+            continue
+        qualifier, column = reference
+        tables = [resolve.get(qualifier)] if qualifier is not None else set(resolve.values())
+        for table in tables:
+            if table in snapshot.tables and column in snapshot.tables[table].column_names:
+                if columns.get((table, column)) != "filter":
+                    columns[(table, column)] = usage
+    return columns
+
+
+#columns that already lead an index or are the rowid primary key
+def indexed_columns(snapshot, table):
+    info = snapshot.tables[table]
+    covered = {index[0] for index in info.indexes if index}
+    covered.update(column.name for column in info.columns if column.primary_key)
+    return covered
+
+
+#(table, column) -> "filter", "join" or "automatic" for indexes that would replace a full scan or an
+#automatic index in this plan
+def missing_indexes(stmt, plan, snapshot):
+    tokens = tokenize_sql(stmt)
+    resolve = alias_map(tokens)
+    candidates = equality_columns(tokens, resolve, snapshot)
+    missing = {}
+    for detail in plan:
+        match = AUTOMATIC_PATTERN.match(detail)
+        if match:
+            table = resolve.get(match.group(1).lower(), match.group(1).lower())
+            for term in match.group(2).split(" AND "):
+                missing[(table, term.split("=")[0].strip().lower())] = "automatic"
+            continue
+        match = SCAN_PATTERN.match(detail)
+        if match:
+            #a filtered table is best reached through its filter column, an index on its join column
+            #would only turn the scan into a loop over the other table
+            table = resolve.get(match.group(1).lower(), match.group(1).lower())
+            columns = {candidate: usage for candidate, usage in candidates.items() if candidate[0] == table}
+            filters = {candidate: usage for candidate, usage in columns.items() if usage == "filter"}
+            for candidate, usage in (filters or columns).items():
+                missing.setdefault(candidate, usage)
+    return {
+        (table, column): usage for (table, column), usage in missing.items()
+        if table in snapshot.tables and column not in indexed_columns(snapshot, table)
+    }
+
+
+def index_name(table, column):
+    return f"ix_{table}_{column}"
+
+
+def create_index_sql(table, column):
+    return f'CREATE INDEX IF NOT EXISTS "{index_name(table, column)}" ON "{table}" ("{column}")'
+
+
+class WorkloadLog:
+
+    def __init__(self, max_shapes=1000):
+        self.max_shapes = max_shapes
+        self._shapes = OrderedDict()    #(database url, shape) -> entry dict
+        self._lock = threading.Lock()
+        self.applied = set()            #(database url, table, column) created by auto-apply
+        self._pending = set()           #database urls where auto-apply may find something new
+
+    #plan is captured with the caller's session on first sight and after an index was added
+    #only reads are kept, EXPLAIN QUERY PLAN of a CREATE TABLE that already ran fails
+    def record(self, session, engine, stmt, params, seconds):
+        if not is_read(stmt):
+            return
+        database = str(engine.url)
+        key = (database, sql_shape(stmt))
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                entry = {
+                    "database": database,
+                    "shape": key[1],
+                    "statement": stmt,
+                    "params": dict(params or {}),
+                    "calls": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "plan": None,
+                }
+                self._shapes[key] = entry
+                while len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            self._shapes.move_to_end(key)
+            entry["calls"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            needs_plan = entry["plan"] is None
+            #auto-apply only has new work when a shape reaches MIN_CALLS or a frequent shape is replanned
+            if entry["calls"] == MIN_CALLS or (needs_plan and entry["calls"] > MIN_CALLS):
+                self._pending.add(database)
+        if needs_plan and engine.dialect.name == "sqlite":
+            plan = [detail for _, _, detail in query_plan(session, stmt, params)]
+            with self._lock:
+                entry["plan"] = plan
+
+    def take_pending(self, database):
+        with self._lock:
+            if database not in self._pending:
+                return False
+            self._pending.discard(database)
+            return True
+
+    def shapes(self, database=None):
+        with self._lock:
+            return [dict(entry) for entry in self._shapes.values() if database is None or entry["database"] == database]
+
+    #plans dropped by replan() or loaded for another database are taken again
+    def refresh_plans(self, engine):
+        if engine.dialect.name != "sqlite":
+            return
+        database = str(engine.url)
+        with self._lock:
+            pending = [entry for entry in self._shapes.values() if entry["database"] == database and entry["plan"] is None]
+        if not pending:
+            return
+        with engine.connect() as connection:
+            for entry in pending:
+                plan = [detail for _, _, detail in query_plan(connection, entry["statement"], entry["params"])]
+                with self._lock:
+                    entry["plan"] = plan
+            connection.rollback()
+
+    #drop captured plans of a database so they reflect newly created indexes
+    def replan(self, database):
+        with self._lock:
+            for entry in self._shapes.values():
+                if entry["database"] == database:
+                    entry["plan"] = None
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+            self.applied.clear()
+            self._pending.clear()
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.shapes(), f, indent=2, default=str)
+
+    #database re-targets the recorded shapes, e.g. when replaying against a copy of the file
+    def load(self, path, database=None):
+        with open(path) as f:
+            entries = json.load(f)
+        with self._lock:
+            for entry in entries:
+                if not is_read(entry["statement"]):
+                    continue
+                if database and database != entry["database"]:
+                    entry["database"], entry["plan"] = database, None
+                self._shapes[(entry["database"], entry["shape"])] = entry
+
+
+workload_log = WorkloadLog(max_shapes=MAX_SHAPES)
+
+
+def record_statement(session, engine, stmt, params, seconds):
+    if not ADVISOR_ENABLED:
+        return
+    try:
+        workload_log.record(session, engine, stmt, params, seconds)
+    except Exception as e:
+        #the advisor must never fail a query that already ran
+        log(f"Index advisor could not record the statement: {e}")
+
+
+#the configured database reads through the read-only pool, any other engine is used as is
+def read_engine_for(engine):
+    return get_read_engine() if engine is get_engine() else engine
+
+
+def column_stats(connection, table, column):
+    rows = connection.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar() or 0
+    distinct = connection.execute(text(f'SELECT COUNT(DISTINCT "{column}") FROM "{table}"')).scalar() or 0
+    return rows, distinct
+
+
+#speedup of one shape in rows touched (plus STATEMENT_OVERHEAD_ROWS), with N rows in the table:
+#- filter: the full scan (N) becomes one key's rows plus the B-tree descent (N/distinct + log2 N)
+#- automatic index or a join grouped through a temp B-tree: the per-query build/sort (N log2 N on top of
+#  the N rows read) goes away, the rows are still read
+#- other joins still read every row, no gain is assumed
+def shape_speedup(usage, rows, distinct, group_sort):
+    if rows < 2 or not distinct:
+        return 1.0
+    if usage == "filter":
+        before, after = rows, rows / distinct + math.log2(rows)
+    elif usage == "automatic" or group_sort:
+        before, after = rows * (1 + math.log2(rows)), rows
+    else:
+        return 1.0
+    return (before + STATEMENT_OVERHEAD_ROWS) / (after + STATEMENT_OVERHEAD_ROWS)
+
+
+#estimated speedup of the recorded time (weighted by each shape's seconds), and the per-lookup upper bound
+def estimate_speedup(rows, distinct, uses):
+    weights = [(seconds or 1e-9, shape_speedup(usage, rows, distinct, group_sort)) for seconds, usage, group_sort in uses]
+    total = sum(seconds for seconds, _ in weights)
+    return {
+        "rows": rows,
+        "distinct": distinct,
+        "estimated_speedup": total / sum(seconds / speedup for seconds, speedup in weights) if weights else 1.0,
+        "lookup_upper_bound": shape_speedup("filter", rows, distinct, False),
+    }
+
+
+#one recommendation per (table, column), weighted by the recorded time of the shapes that need it
+def recommend(engine=None, workload=None, estimate=True):
+    engine = engine or get_engine()
+    workload = workload or workload_log
+    snapshot = get_schema(engine)
+    workload.refresh_plans(engine)
+    recommendations = {}
+    uses = {}   #(table, column) -> [(recorded seconds, usage, plan sorts for GROUP BY), ...]
+    for entry in workload.shapes(str(engine.url)):
+        if not entry["plan"]:
+            continue
+        group_sort = any("TEMP B-TREE FOR GROUP BY" in detail for detail in entry["plan"])
+        for (table, column), usage in missing_indexes(entry["statement"], entry["plan"], snapshot).items():
+            uses.setdefault((table, column), []).append((entry["total_seconds"], usage, group_sort))
+            recommendation = recommendations.setdefault((table, column), {
+                "table": table,
+                "column": column,
+                "index": index_name(table, column),
+                "sql": create_index_sql(table, column),
+                "calls": 0,
+                "total_seconds": 0.0,
+                "shapes": [],
+            })
+            recommendation["calls"] += entry["calls"]
+            recommendation["total_seconds"] += entry["total_seconds"]
+            recommendation["shapes"].append(entry["shape"])
+
+    result = sorted(recommendations.values(), key=lambda item: item["total_seconds"], reverse=True)
+    if estimate and result:
+        with read_engine_for(engine).connect() as connection:
+            for recommendation in result:
+                key = (recommendation["table"], recommendation["column"])
+                recommendation.update(estimate_speedup(*column_stats(connection, *key), uses[key]))
+    return result
+
+
+#replan=False when the index is only created for a measurement and dropped right after
+def create_index(engine, table, column, replan=True, workload=None):
+    with engine.begin() as connection:
+        connection.execute(text(create_index_sql(table, column)))
+    if replan:
+        (workload or workload_log).replan(str(engine.url))
+    log(f"Created index {index_name(table, column)} on {table}({column}).")
+
+
+def drop_index(engine, table, column):
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP INDEX IF EXISTS "{index_name(table, column)}"'))
+
+
+#median wall time of each recorded SELECT, replayed on the read pool of engine's database
+def replay(shapes, engine, repeat=3):
+    timings = {}
+    with read_engine_for(engine).connect() as connection:
+        for entry in shapes:
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                connection.execute(text(entry["statement"]), entry["params"]).fetchall()
+                samples.append(time.perf_counter() - start)
+            timings[entry["shape"]] = sorted(samples)[len(samples) // 2]
+        connection.rollback()
+    return timings
+
+
+#measured speedup per recommendation: its shapes are replayed without and with the index,
+#the index is dropped again unless keep is set
+def evaluate(recommendations, engine=None, workload=None, repeat=3, keep=False):
+    engine = engine or get_engine()
+    workload = workload or workload_log
+    shapes = {entry["shape"]: entry for entry in workload.shapes(str(engine.url))}
+    for recommendation in recommendations:
+        affected = [shapes[shape] for shape in recommendation["shapes"] if shape in shapes]
+        before = replay(affected, engine, repeat)
+        create_index(engine, recommendation["table"], recommendation["column"], replan=keep, workload=workload)
+        after = replay(affected, engine, repeat)
+        if not keep:
+            drop_index(engine, recommendation["table"], recommendation["column"])
+        before_total, after_total = sum(before.values()), sum(after.values())
+        recommendation["replayed_shapes"] = len(before)
+        recommendation["seconds_before"] = before_total
+        recommendation["seconds_after"] = after_total
+        recommendation["measured_speedup"] = before_total / after_total if after_total else None
+        #an index the planner uses for a worse plan is reported, but not recommended
+        recommendation["recommended"] = recommendation["measured_speedup"] is None or recommendation["measured_speedup"] > 1.0
+        recommendation["applied"] = keep
+    return recommendations
+
+
+#opt-in: create indexes for shapes that ran often enough, called after execute_sql closed its session
+def auto_apply_indexes(engine=None):
+    if not (ADVISOR_ENABLED and AUTO_APPLY):
+        return []
+    engine = engine or get_engine()
+    database = str(engine.url)
+    if not workload_log.take_pending(database):
+        return []
+    created = []
+    for recommendation in recommend(engine, estimate=False):
+        key = (database, recommendation["table"], recommendation["column"])
+        if recommendation["calls"] < MIN_CALLS or key in workload_log.applied:
+            continue
+        with workload_log._lock:
+            if key in workload_log.applied:
+                continue
+            workload_log.applied.add(key)
+        try:
+            create_index(engine, recommendation["table"], recommendation["column"])
+            created.append(recommendation["index"])
+        except Exception as e:
+            log(f"Index advisor could not create {recommendation['index']}: {e}")
+    return created
+
+
+def advise(engine=None, workload=None, measure=True, repeat=3, apply=False):
+    engine = engine or get_engine()
+    recommendations = recommend(engine, workload)
+    if measure or apply:
+        evaluate(recommendations, engine, workload, repeat, keep=apply)
+    return {
+        "database": str(engine.url),
+        "shapes": len((workload or workload_log).shapes(str(engine.url))),
+        "recommendations": recommendations,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend indexes from a recorded SQL workload.")
+    parser.add_argument("--database", default=None, help="database URL, defaults to DATABASE_URL")
+    parser.add_argument("--workload", required=True, help="workload JSON saved with workload_log.save()")
+    parser.add_argument("--repeat", type=int, default=3, help="replays per statement")
+    parser.add_argument("--no-measure", action="store_true", help="only estimate, do not replay")
+    parser.add_argument("--apply", action="store_true", help="keep the recommended indexes")
+    parser.add_argument("--output", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    engine = configure_database(args.database)
+    workload = WorkloadLog(max_shapes=MAX_SHAPES)
+    workload.load(args.workload, str(engine.url))
+    report = advise(engine, workload, measure=not args.no_measure, repeat=args.repeat, apply=args.apply)
+
+    for recommendation in report["recommendations"]:
+        measured = recommendation.get("measured_speedup")
+        print(
+            f"{recommendation['sql']}\n"
+            f"  used by {len(recommendation['shapes'])} shapes, {recommendation['calls']} calls, "
+            f"{recommendation['total_seconds']:.3f}s recorded, "
+            f"estimated {recommendation['estimated_speedup']:.1f}x (per lookup at most {recommendation['lookup_upper_bound']:.0f}x)"
+            + (f", measured {measured:.1f}x" if measured else "")
+            + ("" if recommendation.get("recommended", True) else " (slower on this workload, not recommended)")
+        )
+    if not report["recommendations"]:
+        print("No index recommendations for this workload.")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
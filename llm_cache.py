@@ -0,0 +1,154 @@
+#opt-in on-disk cache for LLM completions in a separate local SQLite file
+#keyed by the model configuration (model name, params, structured-output schema) and the full prompt messages
+#WAL mode + busy timeout make it safe for the CLI and Streamlit processes to share one file
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from metrics import CACHE_HIT_MARKER, metrics
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+#loads() warns about its beta status on every cache hit, a process-wide filter for just that message
+#(warnings.catch_warnings around the call is not thread-safe)
+warnings.filterwarnings("ignore", message=r"The function `loads` is in beta", category=LangChainBetaWarning)
+
+
+class SQLiteLLMCache(BaseCache):
+
+    def __init__(self, path="llm_cache.db", max_bytes=DEFAULT_MAX_BYTES, max_entries=None, busy_timeout=30.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._create_table()
+
+    #one connection per thread and per process, sqlite3 connections must not cross either
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create_table(self):
+        conn = self._connection()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed)")
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _model_name(llm_string):
+        #llm_string is either serialized JSON or "str(sorted(params))", both carry the model name
+        for marker in ('"model_name": "', "('model_name', '"):
+            start = llm_string.find(marker)
+            if start != -1:
+                start += len(marker)
+                return llm_string[start:llm_string.find(llm_string[start - 1], start)]
+        return None
+
+    def lookup(self, prompt, llm_string):
+        key = self._key(prompt, llm_string)
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        metrics.inc("cache_hits", cache="llm")
+        try:
+            conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.OperationalError:
+            #recency is best effort, a busy writer must not fail a cache hit
+            pass
+        generations = loads(row[0])
+        #lets LLMMetricsHandler tell a served response from a real call
+        for generation in generations:
+            generation.generation_info = {**(generation.generation_info or {}), CACHE_HIT_MARKER: True}
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        value = dumps(list(return_val))
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (self._key(prompt, llm_string), self._model_name(llm_string), value, len(value), now, now),
+        )
+        self._evict(conn)
+
+    #drop least recently used entries until the file fits the configured size
+    def _evict(self, conn):
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                    break
+                doomed.append((key,))
+                total -= size
+                count -= 1
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+            conn.execute("COMMIT")
+            self.evictions += len(doomed)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self, **kwargs):
+        self._connection().execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+#build the cache from LLM_CACHE_PATH / LLM_CACHE_MAX_BYTES, None when caching is not enabled
+def llm_cache_from_env():
+    path = os.environ.get("LLM_CACHE_PATH")
+    if not path:
+        return None
+    max_bytes = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+    return SQLiteLLMCache(path, max_bytes=max_bytes)
@@ -0,0 +1,143 @@
+#process-wide registry of pre-built chat clients and compiled prompt chains
+#clients are keyed by role and temperature and share one keep-alive HTTP pool per sync / async transport
+#configure() is called from setup_environment, tests can swap in a fake model factory
+#an optional persistent LLM cache is attached to every deterministic (temperature 0) client
+
+import asyncio
+import threading
+import httpx
+from langchain_openai import ChatOpenAI
+from langchain_core.output_parsers import StrOutputParser
+from metrics import METRICS_ENABLED, LLMMetricsHandler
+
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+class LLMRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}  #(role, temperature) -> chat model
+        self._chains = {}   #(name, role, temperature) -> prompt | model | parser
+        self._http_client = None
+        self._http_async_client = None
+        self._async_loop = None     #event loop whose connections the async pool holds
+        self.configure()
+
+    def configure(self, model=DEFAULT_MODEL, max_tokens=None, models=None, factory=None, max_connections=20, llm_cache=None):
+        with self._lock:
+            self.model = model
+            self.max_tokens = max_tokens
+            self.models = dict(models or {})    #optional per-role model override
+            self.factory = factory or self._openai_factory
+            self.max_connections = max_connections
+            self.llm_cache = llm_cache
+            self._clients.clear()
+            self._chains.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            #aclose() needs the loop the connections belong to, they are released with the client
+            self._http_async_client = None
+            self._async_loop = None
+
+    #drop every built client and chain, the next call rebuilds them with the current settings
+    def reset(self):
+        with self._lock:
+            self._clients.clear()
+            self._chains.clear()
+
+    def _shared_http_client(self):
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self._limits(), timeout=60.0)
+        return self._http_client
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _shared_http_async_client(self):
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=60.0)
+        return self._http_async_client
+
+    #pooled async connections are bound to the event loop that opened them, a new loop (asyncio.run per
+    #batch) gets a fresh pool and the clients built on the old one are rebuilt
+    def _follow_event_loop(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if loop is self._async_loop:
+            return
+        with self._lock:
+            if loop is self._async_loop:
+                return
+            if self._async_loop is not None:
+                self._clients.clear()
+                self._chains.clear()
+                self._http_async_client = None
+            self._async_loop = loop
+
+    def _openai_factory(self, role, temperature):
+        return ChatOpenAI(
+            model=self.models.get(role, self.model),
+            temperature=temperature,
+            max_tokens=self.max_tokens,
+            http_client=self._shared_http_client(),
+            http_async_client=self._shared_http_async_client(),
+        )
+
+    def get(self, role, temperature=0):
+        self._follow_event_loop()
+        key = (role, temperature)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.factory(role, temperature)
+                    #sampled (temperature > 0) responses are meant to vary, only cache deterministic ones
+                    if self.llm_cache is not None and temperature == 0 and getattr(client, "cache", None) is None:
+                        client.cache = self.llm_cache
+                    #latency, token and cost metrics per role
+                    if METRICS_ENABLED and not getattr(client, "callbacks", None):
+                        client.callbacks = [LLMMetricsHandler(role)]
+                    self._clients[key] = client
+        return client
+
+    #prompt | model (| structured output or string parser), built once per name/role/temperature
+    def chain(self, name, prompt, role, temperature=0, schema=None, method=None):
+        self._follow_event_loop()
+        key = (name, role, temperature)
+        chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+
+        llm = self.get(role, temperature)
+        if schema is None:
+            chain = prompt | llm | StrOutputParser()
+        elif method:
+            chain = prompt | llm.with_structured_output(schema, method=method)
+        else:
+            chain = prompt | llm.with_structured_output(schema)
+        with self._lock:
+            chain = self._chains.setdefault(key, chain)
+        return chain
+
+
+#shared by all graph nodes
+registry = LLMRegistry()
+
+
+def configure_llms(**kwargs):
+    registry.configure(**kwargs)
+    return registry
+
+
+def get_llm(role, temperature=0):
+    return registry.get(role, temperature)
+
+
+def get_chain(name, prompt, role, temperature=0, schema=None, method=None):
+    return registry.chain(name, prompt, role, temperature, schema, method)
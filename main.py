@@ -1,8 +1,8 @@
-import os
 from dotenv import load_dotenv
-from sql_connection import init_db
+from sql_connection import init_db, configure_database, database_exists
 from set_env import setup_environment
 from graph import workflow, app
+import runner
 
 # Load environment variables
 load_dotenv()
@@ -10,29 +10,14 @@ load_dotenv()
 # Setup OpenAI model
 llm = setup_environment()
 
-# Initialize database if needed
-if not os.path.exists("example.db"):
+# Initialize database if needed (DATABASE_URL may come from .env)
+configure_database()
+if not database_exists():
     init_db()
 
 # Function to run a query
 def run_query(question, user_id=None):
-    initial_state = {
-        "question": question,
-        "sql_query": "",
-        "query_result": "",
-        "query_rows": [],
-        "current_user": "",
-        "attempts": 0,
-        "relevance": "",
-        "sql_error": False
-    }
-    
-    # Only set user_id if explicitly provided
-    config = {"configurable": {}}
-    if user_id:
-        config["configurable"]["current_user_id"] = user_id
-    
-    result = app.invoke(initial_state, config=config)
+    result = runner.run_query(question, user_id)
     return result["query_result"]
 
 # Test the agent
@@ -0,0 +1,273 @@
+#in-process instrumentation: histograms and counters for graph nodes, LLM calls, SQL and whole questions
+#exported as a Python dict, JSON or Prometheus text format
+#log() replaces the progress prints, LOG_FORMAT=json turns them into structured log records
+
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+METRICS_ENABLED = os.environ.get("METRICS", "1") != "0"
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "print")     #"print" or "json"
+
+#USD per 1K tokens, defaults are gpt-3.5-turbo list prices
+PROMPT_PRICE = float(os.environ.get("LLM_PROMPT_PRICE", "0.0005"))
+COMPLETION_PRICE = float(os.environ.get("LLM_COMPLETION_PRICE", "0.0015"))
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+RECENT_SAMPLES = 1000   #values kept per histogram for percentiles
+#generation_info flag set by the LLM cache on generations it serves, LangChain still fires on_llm_end for them
+CACHE_HIT_MARKER = "llm_cache_hit"
+
+_logger = logging.getLogger("sql_agent")
+_current_node = contextvars.ContextVar("current_node", default="")
+
+#JSON records go to stderr unless the application configured the "sql_agent" logger itself
+if LOG_FORMAT == "json" and not _logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  #last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def label_text(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}    #name -> {label key -> Histogram}
+        self.counters = {}      #name -> {label key -> value}
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            key = label_key(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def inc(self, name, value=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.snapshot()} for key, histogram in series.items()]
+                    for name, series in self.histograms.items()
+                },
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+            }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix="sql_agent_"):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{label_text(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{prefix}{name}_bucket{label_text(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{prefix}{name}_sum{label_text(key)} {histogram.sum}")
+                    lines.append(f"{prefix}{name}_count{label_text(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+metrics = Metrics()
+
+
+#progress output: a plain print by default, one JSON record per line with LOG_FORMAT=json
+def log(message, **fields):
+    if LOG_FORMAT != "json":
+        print(message)
+        return
+    record = {"time": time.time(), "message": message}
+    if _current_node.get():
+        record["node"] = _current_node.get()
+    record.update(fields)
+    _logger.info(json.dumps(record, default=str))
+
+
+#wall time and errors of a graph node, the node name is also attached to log records
+def instrument(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            metrics.observe("node_seconds", time.perf_counter() - start, node=name, status=status)
+            _current_node.reset(token)
+    return wrapper
+
+
+def ainstrument(name, afunc):
+    @functools.wraps(afunc)
+    async def wrapper(*args, **kwargs):
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await afunc(*args, **kwargs)
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            metrics.observe("node_seconds", time.perf_counter() - start, node=name, status=status)
+            _current_node.reset(token)
+    return wrapper
+
+
+def token_usage(response):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    if prompt or completion:
+        return prompt, completion
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+    return prompt, completion
+
+
+def is_cache_hit(response):
+    return any(
+        (generation.generation_info or {}).get(CACHE_HIT_MARKER)
+        for generations in response.generations
+        for generation in generations
+    )
+
+
+#attached to every chat client by the LLM registry: latency, tokens and estimated cost per role
+class LLMMetricsHandler(BaseCallbackHandler):
+
+    def __init__(self, role):
+        self.role = role
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    #cache hits are counted by the cache (cache_hits{cache="llm"}), not as calls, tokens or cost
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if is_cache_hit(response):
+            return
+        if started is not None:
+            metrics.observe("llm_seconds", time.perf_counter() - started, role=self.role)
+        metrics.inc("llm_calls", role=self.role)
+        prompt, completion = token_usage(response)
+        metrics.inc("llm_prompt_tokens", prompt, role=self.role)
+        metrics.inc("llm_completion_tokens", completion, role=self.role)
+        metrics.inc("llm_cost_usd", (prompt * PROMPT_PRICE + completion * COMPLETION_PRICE) / 1000, role=self.role)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        metrics.inc("llm_errors", role=self.role)
+
+
+#per-question summary, recorded by the runner once the graph finishes
+def record_question(state, seconds):
+    metrics.observe("question_seconds", seconds)
+    metrics.observe("question_attempts", state.get("attempts", 0), buckets=COUNT_BUCKETS)
+    metrics.inc("questions", outcome="error" if state.get("sql_error") else "ok")
+    if state.get("translation_hit"):
+        metrics.inc("cache_hits", cache="translation")
+    if state.get("template"):
+        metrics.inc("template_hits", template=state["template"])
+
+
+def metrics_snapshot():
+    return metrics.snapshot()
+
+
+def metrics_json():
+    return metrics.to_json()
+
+
+def metrics_prometheus():
+    return metrics.to_prometheus()
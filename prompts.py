@@ -0,0 +1,264 @@
+#prompt templates for every LLM call in the graph
+#values are passed as template variables so chains can be compiled once and reused
+
+from langchain_core.prompts import ChatPromptTemplate
+
+
+RELEVANCE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an assistant that determines whether a given question is related to the following database schema.
+
+Schema:
+{schema}
+
+Respond with only "relevant" or "not_relevant".
+Consider questions about the database structure, users, food items, orders, or general database content as "relevant".
+""",
+        ),
+        ("human", "Question: {question}"),
+    ]
+)
+
+SQL_USER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an assistant that converts natural language questions into SQL queries based on the following schema:
+
+{schema}
+
+The current user is '{current_user}' with users.id = {current_user_id}. Unless the question is explicitly about all users or the entire database, ensure that all query-related data is scoped to this user.
+
+IMPORTANT RULES:
+1. For user-specific queries, ensure data is scoped to this user using WHERE user_id = {current_user_id}
+2. For database-wide queries about all users/data, do NOT restrict to the current user
+3. For INSERT operations that specify both a user and related data (like an order), create multiple SQL statements as needed
+4. Alias columns appropriately to match expected keys (e.g., 'food.name' as 'food_name')
+5. For multiple SQL statements, separate them with a semicolon
+
+Provide only the SQL query without any explanations.
+""",
+        ),
+        ("human", "Question: {question}{feedback}"),
+    ]
+)
+
+SQL_DATABASE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an assistant that converts natural language questions into SQL queries based on the following schema:
+
+{schema}
+
+This is a database-wide query with no specific user context.
+
+IMPORTANT RULES:
+1. Process queries about the entire database appropriately
+2. For INSERT operations, create multiple SQL statements as needed
+3. Alias columns appropriately to match expected keys (e.g., 'food.name' as 'food_name')
+4. For multiple SQL statements, separate them with a semicolon
+
+Provide only the SQL query without any explanations.
+""",
+        ),
+        ("human", "Question: {question}{feedback}"),
+    ]
+)
+
+#fused mode: one call decides relevance and writes the SQL against a single copy of the schema
+FUSED_USER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an assistant that first determines whether a question is related to the following database schema and, if it is, converts it into a SQL query.
+
+{schema}
+
+Set relevance to "relevant" or "not_relevant".
+Consider questions about the database structure, users, food items, orders, or general database content as "relevant".
+If the question is not relevant, leave sql_query empty.
+
+The current user is '{current_user}' with users.id = {current_user_id}. Unless the question is explicitly about all users or the entire database, ensure that all query-related data is scoped to this user.
+
+IMPORTANT RULES:
+1. For user-specific queries, ensure data is scoped to this user using WHERE user_id = {current_user_id}
+2. For database-wide queries about all users/data, do NOT restrict to the current user
+3. For INSERT operations that specify both a user and related data (like an order), create multiple SQL statements as needed
+4. Alias columns appropriately to match expected keys (e.g., 'food.name' as 'food_name')
+5. For multiple SQL statements, separate them with a semicolon
+
+Provide only the SQL query without any explanations.
+""",
+        ),
+        ("human", "Question: {question}"),
+    ]
+)
+
+FUSED_DATABASE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an assistant that first determines whether a question is related to the following database schema and, if it is, converts it into a SQL query.
+
+{schema}
+
+Set relevance to "relevant" or "not_relevant".
+Consider questions about the database structure, users, food items, orders, or general database content as "relevant".
+If the question is not relevant, leave sql_query empty.
+
+This is a database-wide query with no specific user context.
+
+IMPORTANT RULES:
+1. Process queries about the entire database appropriately
+2. For INSERT operations, create multiple SQL statements as needed
+3. Alias columns appropriately to match expected keys (e.g., 'food.name' as 'food_name')
+4. For multiple SQL statements, separate them with a semicolon
+
+Provide only the SQL query without any explanations.
+""",
+        ),
+        ("human", "Question: {question}"),
+    ]
+)
+
+ANSWER_SYSTEM = """You are an assistant that converts SQL query results into clear, natural language responses.
+            """
+
+ALL_USERS_SYSTEM = """You are an assistant that converts SQL query results into clear, natural language responses.
+        Respond appropriately to queries about the database as a whole.
+        """
+
+#(system, human) per answer shape, compiled once into chains by the registry
+ANSWER_PROMPTS = {
+    "all_users": ChatPromptTemplate.from_messages(
+        [
+            ("system", ALL_USERS_SYSTEM),
+            (
+                "human",
+                """SQL Query:
+{sql}
+
+Result:
+{names}
+
+Original Question: {question}
+
+Formulate a clear answer that lists all users in the database.""",
+            ),
+        ]
+    ),
+    "no_users": ChatPromptTemplate.from_messages(
+        [
+            ("system", ALL_USERS_SYSTEM),
+            (
+                "human",
+                """SQL Query:
+{sql}
+
+Result:
+No results found.
+
+Original Question: {question}
+
+Formulate a clear answer stating that there are no users in the database.""",
+            ),
+        ]
+    ),
+    "error": ChatPromptTemplate.from_messages(
+        [
+            ("system", ANSWER_SYSTEM),
+            (
+                "human",
+                """SQL Query:
+{sql}
+
+Result:
+{result}
+
+Formulate a clear error message informing the user about the issue.""",
+            ),
+        ]
+    ),
+    "no_results": ChatPromptTemplate.from_messages(
+        [
+            ("system", ANSWER_SYSTEM),
+            (
+                "human",
+                """SQL Query:
+{sql}
+
+Result:
+No results found.
+
+Original Question: {question}
+
+Formulate a response indicating that no results were found for this query.""",
+            ),
+        ]
+    ),
+    "results": ChatPromptTemplate.from_messages(
+        [
+            ("system", ANSWER_SYSTEM),
+            (
+                "human",
+                """SQL Query:
+{sql}
+
+Results:
+{query_rows}
+
+Original Question: {question}
+
+Formulate a clear and understandable answer to the original question based on these results.""",
+            ),
+        ]
+    ),
+    "confirmation": ChatPromptTemplate.from_messages(
+        [
+            ("system", ANSWER_SYSTEM),
+            (
+                "human",
+                """SQL Query:
+{sql}
+
+Result:
+{result}
+
+Original Question: {question}
+
+Formulate a confirmation message stating that the requested action has been completed successfully.""",
+            ),
+        ]
+    ),
+}
+
+REWRITE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an assistant that reformulates an original question to enable more precise SQL queries. Ensure that all necessary details, such as table joins, are preserved to retrieve complete and accurate data.
+    """,
+        ),
+        (
+            "human",
+            "Original Question: {question}{feedback}\nReformulate the question to enable more precise SQL queries, ensuring all necessary details are preserved.",
+        ),
+    ]
+)
+
+FUNNY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are a charming and funny assistant who responds in a playful manner.
+    """,
+        ),
+        (
+            "human",
+            "I can not help with that, but doesn't asking questions make you hungry? You can always order something delicious.",
+        ),
+    ]
+)
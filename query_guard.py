@@ -0,0 +1,161 @@
+#cost guard for generated SELECTs
+#EXPLAIN QUERY PLAN is checked for nested full scans (cartesian products) above a size threshold,
+#unbounded SELECTs get a LIMIT one past the row cap, and every statement runs under a wall-clock
+#timeout enforced by the SQLite progress handler
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from sqlalchemy import text
+from query_stream import MAX_RESULT_ROWS, stream_statement
+from sql_connection import ReadSessionLocal, get_engine
+from result_cache import data_version
+from sql_text import tokenize_sql
+from sql_validator import table_references
+
+
+GUARD_ENABLED = os.environ.get("QUERY_GUARD", "1") != "0"
+STATEMENT_TIMEOUT = float(os.environ.get("STATEMENT_TIMEOUT", "30"))
+MAX_CARTESIAN_ROWS = int(os.environ.get("MAX_CARTESIAN_ROWS", "1000000"))
+#SQLite VM instructions between two deadline checks
+PROGRESS_STEPS = 10000
+
+SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+class QueryRejected(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def has_limit(stmt):
+    depth = 0
+    for kind, value in tokenize_sql(stmt):
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and value.lower() == "limit":
+            return True
+    return False
+
+
+#LIMIT cap + 1 so collect_rows can still tell that rows were cut off
+def add_limit(stmt, limit=MAX_RESULT_ROWS + 1):
+    if has_limit(stmt):
+        return stmt
+    return f"{stmt} LIMIT {limit}"
+
+
+#(id, parent, detail) rows of EXPLAIN QUERY PLAN
+def query_plan(session, stmt, params=None):
+    rows = session.execute(text(f"EXPLAIN QUERY PLAN {stmt}"), params or {}).fetchall()
+    return [(row[0], row[1], row[-1]) for row in rows]
+
+
+_sizes = {}     #(engine url, table) -> (data version, row count)
+_sizes_lock = threading.Lock()
+
+
+def table_size(session, engine, table):
+    key = (str(engine.url), table)
+    version = data_version(engine).current()
+    with _sizes_lock:
+        cached = _sizes.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    count = session.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+    with _sizes_lock:
+        _sizes[key] = (version, count)
+    return count
+
+
+#error message when sibling full scans (nested loops without a usable join) multiply past the threshold
+def check_plan(session, engine, stmt, params=None):
+    tables, _ = table_references(tokenize_sql(stmt))
+    resolve = {}
+    for name, aliases in tables.items():
+        resolve[name] = name
+        for alias in aliases:
+            resolve[alias] = name
+
+    scans = {}  #parent id -> scanned tables
+    for _, parent, detail in query_plan(session, stmt, params):
+        match = SCAN_PATTERN.match(detail)
+        if match and match.group(1).lower() in resolve:
+            scans.setdefault(parent, []).append(resolve[match.group(1).lower()])
+
+    for scanned in scans.values():
+        if len(scanned) < 2:
+            continue
+        combinations = 1
+        for table in scanned:
+            combinations *= max(table_size(session, engine, table), 1)
+        if combinations > MAX_CARTESIAN_ROWS:
+            return (
+                f"the query scans {', '.join(scanned)} in nested loops without a usable join condition "
+                f"(about {combinations} row combinations, limit {MAX_CARTESIAN_ROWS}). "
+                "Join the tables on their key columns or filter them first."
+            )
+    return None
+
+
+#plan check plus LIMIT injection for one SELECT, returns the statement to run
+def guard_select(session, engine, stmt, params=None):
+    if not GUARD_ENABLED:
+        return stmt
+    if engine.dialect.name == "sqlite":
+        error = check_plan(session, engine, stmt, params)
+        if error is not None:
+            raise QueryRejected(error)
+    return add_limit(stmt)
+
+
+#abort the statement once the deadline passes: a non-zero progress handler return interrupts SQLite
+@contextmanager
+def statement_timeout(session, engine, seconds=STATEMENT_TIMEOUT):
+    if not GUARD_ENABLED or not seconds or engine.dialect.name != "sqlite":
+        yield
+        return
+    connection = session.connection().connection.driver_connection
+    deadline = time.monotonic() + seconds
+    expired = []
+
+    def handler():
+        if time.monotonic() > deadline:
+            expired.append(True)
+            return 1
+        return 0
+
+    connection.set_progress_handler(handler, PROGRESS_STEPS)
+    try:
+        yield
+    except Exception as e:
+        if expired:
+            raise QueryTimeout(f"the statement ran longer than {seconds:g} seconds and was aborted.") from e
+        raise
+    finally:
+        connection.set_progress_handler(None, 0)
+
+
+#one page of a SELECT for the UI, under the same plan check, LIMIT and timeout as execute_sql
+#the rows before the page are streamed past, never materialized
+def fetch_page(statement, params=None, page=0, page_size=100):
+    engine = get_engine()
+    session = ReadSessionLocal()
+    try:
+        statement = guard_select(session, engine, statement, params)
+        with statement_timeout(session, engine):
+            result = stream_statement(session, statement, params, chunk_size=page_size)
+            columns = list(result.keys())
+            rows = [dict(zip(columns, row)) for row in islice(result, page * page_size, (page + 1) * page_size)]
+            result.close()
+        return rows
+    finally:
+        session.close()
@@ -0,0 +1,58 @@
+#streaming SELECT execution: rows are pulled from the cursor in chunks
+#execute_sql collects them under a row / byte cap with a truncation flag
+#iter_query lets callers walk big results lazily, query_guard.fetch_page pages through them for the UI
+
+import os
+from sqlalchemy import text
+from sql_connection import ReadSessionLocal
+from result_set import ResultSet
+
+
+MAX_RESULT_ROWS = int(os.environ.get("MAX_RESULT_ROWS", "10000"))
+MAX_RESULT_BYTES = int(os.environ.get("MAX_RESULT_BYTES", str(16 * 1024 * 1024)))
+CHUNK_SIZE = int(os.environ.get("RESULT_CHUNK_SIZE", "500"))
+
+
+#approximate in-memory payload of a row, strings/bytes by length and scalars as 8 bytes
+def row_size(row):
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+
+
+def stream_statement(session, statement, params=None, chunk_size=CHUNK_SIZE):
+    return session.execute(
+        text(statement).execution_options(stream_results=True, yield_per=chunk_size),
+        params or {},
+    )
+
+
+#ResultSet from an executed SELECT, stopping at whichever cap is hit first
+def collect_rows(result, max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES, chunk_size=CHUNK_SIZE):
+    columns = list(result.keys())
+    rows = []
+    size = 0
+    truncated = False
+    for chunk in result.partitions(chunk_size):
+        for row in chunk:
+            size += row_size(row)
+            if len(rows) >= max_rows or size > max_bytes:
+                truncated = True
+                break
+            rows.append(row)
+        if truncated:
+            break
+    result.close()
+    return ResultSet.from_tuples(columns, rows, truncated)
+
+
+#yields row dicts one at a time, the session stays open until the generator is exhausted or closed
+def iter_query(statement, params=None, chunk_size=CHUNK_SIZE):
+    session = ReadSessionLocal()
+    try:
+        result = stream_statement(session, statement, params, chunk_size)
+        columns = list(result.keys())
+        for chunk in result.partitions(chunk_size):
+            for row in chunk:
+                yield dict(zip(columns, row))
+    finally:
+        session.close()
+
@@ -0,0 +1,187 @@
+#deterministic fast path for frequent question shapes
+#a template matches the normalized question, checks the schema catalog / entity values
+#and emits parameterized SQL that goes straight to execute_sql without any LLM call
+
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional
+from schema_catalog import get_schema, get_entity_values
+from relevance_classifier import stem
+from translation_cache import normalize_question
+
+
+@dataclass(frozen=True)
+class TemplateContext:
+    snapshot: object        #SchemaSnapshot
+    entity_values: dict     #(table, column) -> sampled values
+    current_user: str
+    current_user_id: Optional[int] = None
+
+    def table(self, word):
+        #"users", "user" and "food items" all resolve to a catalog table
+        word = stem(word.lower().split()[0])
+        for name in self.snapshot.tables:
+            if stem(name.lower()) == word:
+                return name
+        return None
+
+    def has_columns(self, table, *columns):
+        info = self.snapshot.tables.get(table)
+        return info is not None and all(column in info.column_names for column in columns)
+
+    def entity(self, table, column, text):
+        text = text.strip().lower()
+        for value in self.entity_values.get((table, column), ()):
+            if value.lower() == text:
+                return value
+        return None
+
+    #rows of user-linked tables (a user_id column) belong to the current user, like the user-scoped prompt
+    def user_scope(self, table):
+        if self.current_user_id is None or not self.has_columns(table, "user_id"):
+            return "", {}
+        return " WHERE user_id = :user_id", {"user_id": self.current_user_id}
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    name: str
+    pattern: re.Pattern
+    build: Callable     #(match, TemplateContext) -> (sql, params) or None
+
+
+class TemplateRegistry:
+
+    def __init__(self):
+        self.templates = []
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = Counter()
+
+    def register(self, name, pattern):
+        def decorator(build):
+            template = QueryTemplate(name, re.compile(pattern), build)
+            with self._lock:
+                self.templates = [t for t in self.templates if t.name != name] + [template]
+            return build
+        return decorator
+
+    #first template whose pattern and catalog checks both succeed: (name, sql, params) or None
+    def match(self, question, context):
+        text = normalize_question(question)
+        result = None
+        for template in self.templates:
+            found = template.pattern.fullmatch(text)
+            if not found:
+                continue
+            built = template.build(found, context)
+            if built is not None:
+                result = (template.name, built[0], built[1])
+                break
+        with self._lock:
+            self.lookups += 1
+            if result is not None:
+                self.hits[result[0]] += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "lookups": self.lookups,
+                "hits": hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "by_template": dict(self.hits),
+            }
+
+
+templates = TemplateRegistry()
+register_template = templates.register
+TEMPLATES_ENABLED = os.environ.get("QUERY_TEMPLATES", "1") != "0"
+
+
+@register_template("list_table", r"(?:show|list|get|display)(?: me)?(?: all)?(?: the)? (?P<table>\w+)")
+def list_table(match, context):
+    table = context.table(match["table"])
+    if table is None:
+        return None
+    where, params = context.user_scope(table)
+    return f"SELECT * FROM {table}{where}", params
+
+
+@register_template("available_items", r"what (?P<table>\w+)(?: items)? (?:are|is) (?:available|there|on the menu)")
+def available_items(match, context):
+    table = context.table(match["table"])
+    if table is None:
+        return None
+    where, params = context.user_scope(table)
+    return f"SELECT * FROM {table}{where}", params
+
+
+@register_template("count_table", r"how many (?P<table>\w+)(?: are there| do we have| exist)?")
+def count_table(match, context):
+    table = context.table(match["table"])
+    if table is None:
+        return None
+    where, params = context.user_scope(table)
+    return f"SELECT COUNT(*) AS count FROM {table}{where}", params
+
+
+@register_template("food_price", r"(?:how much (?:does|do|is) (?P<a>.+?)(?: cost)?|what is the price of (?P<b>.+?))")
+def food_price(match, context):
+    name = context.entity("food", "name", match["a"] or match["b"])
+    if name is None or not context.has_columns("food", "name", "price"):
+        return None
+    return "SELECT name, price FROM food WHERE name = :name", {"name": name}
+
+
+USER_ORDERS_SQL = (
+    "SELECT food.name AS food_name, food.price AS price FROM orders "
+    "JOIN food ON food.id = orders.food_id "
+    "JOIN users ON users.id = orders.user_id "
+    "WHERE users.name = :name"
+)
+
+#the current user is already resolved to an id, no join on users needed
+MY_ORDERS_SQL = (
+    "SELECT food.name AS food_name, food.price AS price FROM orders "
+    "JOIN food ON food.id = orders.food_id "
+    "WHERE orders.user_id = :user_id"
+)
+
+
+def orders_supported(context):
+    return (
+        context.has_columns("orders", "food_id", "user_id")
+        and context.has_columns("food", "id", "name", "price")
+        and context.has_columns("users", "id", "name")
+    )
+
+
+@register_template("user_orders", r"what (?:has|did) (?P<user>\w+) order(?:ed)?")
+def user_orders(match, context):
+    name = context.entity("users", "name", match["user"])
+    if name is None or not orders_supported(context):
+        return None
+    return USER_ORDERS_SQL, {"name": name}
+
+
+@register_template("my_orders", r"what (?:have|did) i order(?:ed)?|(?:show|list)(?: me)? my orders")
+def my_orders(match, context):
+    if context.current_user_id is None or not orders_supported(context):
+        return None
+    return MY_ORDERS_SQL, {"user_id": context.current_user_id}
+
+
+def match_question(engine, question, current_user="", current_user_id=None):
+    if not TEMPLATES_ENABLED:
+        return None
+    context = TemplateContext(get_schema(engine), get_entity_values(engine), current_user, current_user_id)
+    return templates.match(question, context)
+
+
+def template_stats():
+    return templates.stats()
@@ -0,0 +1,140 @@
+#recovery mode: after a failed query, generate several SQL candidates at once instead of
+#rewrite -> generate -> execute one after another
+#candidates vary temperature and phrasing, each is validated and dry-run in its own rolled-back
+#transaction, the first one that succeeds is kept and the rest are cancelled or ignored
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import text
+from sql_connection import ReadSessionLocal
+from sql_validator import validate_sql
+from sql_text import split_statements, is_read
+
+
+RECOVERY_MODE = os.environ.get("RECOVERY_MODE", "0") == "1"
+RECOVERY_CANDIDATES = int(os.environ.get("RECOVERY_CANDIDATES", "3"))
+if RECOVERY_CANDIDATES < 1:
+    raise ValueError("RECOVERY_CANDIDATES must be at least 1.")
+
+NO_CANDIDATES = "no recovery candidates were generated."
+
+#(temperature, hint appended to the error feedback), cycled when more candidates are requested
+CANDIDATE_VARIANTS = (
+    (0, ""),
+    (0.3, "\nUse explicit JOINs and qualify every column with its table name."),
+    (0.7, "\nWrite the simplest query that answers the question, using only tables and columns from the schema."),
+)
+
+
+def candidate_variants(count=None):
+    count = RECOVERY_CANDIDATES if count is None else count
+    return [CANDIDATE_VARIANTS[i % len(CANDIDATE_VARIANTS)] for i in range(count)]
+
+
+class RecoveryStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rounds = 0
+        self.recovered = 0      #rounds where a candidate passed
+        self.candidates = 0
+        self.failed_candidates = 0
+
+    def record(self, candidates, failed, recovered):
+        with self._lock:
+            self.rounds += 1
+            self.candidates += candidates
+            self.failed_candidates += failed
+            if recovered:
+                self.recovered += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "recovered": self.recovered,
+                "candidates": self.candidates,
+                "failed_candidates": self.failed_candidates,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.rounds = self.recovered = self.candidates = self.failed_candidates = 0
+
+
+recovery_stats = RecoveryStats()
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("RECOVERY_WORKERS", "8")),
+    thread_name_prefix="recovery-sql",
+)
+
+
+#validation plus a dry run: SELECTs fetch their first row, writes are only compiled (EXPLAIN)
+#everything happens in a transaction that is rolled back
+def dry_run(engine, sql, params=None):
+    error = validate_sql(engine, sql, params)
+    if error is not None:
+        return error
+    session = ReadSessionLocal()
+    try:
+        for stmt in split_statements(sql):
+            if is_read(stmt):
+                session.execute(text(stmt), params or {}).fetchone()
+        return None
+    except Exception as e:
+        return str(getattr(e, "orig", None) or e)
+    finally:
+        session.rollback()
+        session.close()
+
+
+#each call returns (sql, error), returns the first (sql, None) to finish or the first candidate's failure
+def first_success(calls):
+    if not calls:
+        return "", NO_CANDIDATES
+    futures = {_executor.submit(call): index for index, call in enumerate(calls)}
+    failures = {}
+    try:
+        for future in as_completed(futures):
+            try:
+                sql, error = future.result()
+            except Exception as e:
+                sql, error = "", str(e)
+            if error is None:
+                recovery_stats.record(len(calls), len(failures), True)
+                return sql, None
+            failures[futures[future]] = (sql, error)
+    finally:
+        #candidates still queued are dropped, running threads finish and are ignored
+        for future in futures:
+            future.cancel()
+    recovery_stats.record(len(calls), len(failures), False)
+    return failures[min(failures)]
+
+
+async def afirst_success(calls):
+    if not calls:
+        return "", NO_CANDIDATES
+    tasks = {asyncio.ensure_future(call()): index for index, call in enumerate(calls)}
+    failures = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    sql, error = task.result()
+                except Exception as e:
+                    sql, error = "", str(e)
+                if error is None:
+                    recovery_stats.record(len(calls), len(failures), True)
+                    return sql, None
+                failures[tasks[task]] = (sql, error)
+    finally:
+        for task in pending:
+            task.cancel()
+    recovery_stats.record(len(calls), len(failures), False)
+    return failures[min(failures)]
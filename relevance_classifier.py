@@ -0,0 +1,183 @@
+#local relevance pre-classifier that runs before the check_relevance LLM call
+#built from the schema catalog plus sampled entity values (user names, food names)
+#decides obvious questions in microseconds and leaves ambiguous ones to the LLM
+
+import os
+import re
+import threading
+from schema_catalog import get_schema, get_entity_values
+
+
+#words that say "query the data" without naming a table, they keep a question ambiguous
+DATA_INTENT_WORDS = {
+    "show", "list", "count", "many", "much", "total", "average", "sum", "most", "least",
+    "add", "insert", "create", "delete", "remove", "update", "change", "order", "ordered",
+    "buy", "bought", "price", "cost", "table", "tables", "database", "record", "records",
+    "my", "i", "me", "people", "customer", "customers", "menu", "item", "items",
+}
+
+#too generic to count as a schema hit on their own ("what is your name", "what is the id")
+GENERIC_COLUMNS = {"id", "name", "type", "date"}
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "for", "to", "and",
+    "or", "what", "which", "who", "whom", "how", "do", "does", "did", "with", "by", "at", "it",
+    "that", "this", "there", "s", "about", "from", "all", "any", "some", "like", "can", "you",
+}
+
+STRONG = 2
+WEAK = 1
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9@.]+", text.lower().replace("'", " "))
+
+
+#naive singular form so "users" matches "user" and "orders" matches "order"
+def stem(token):
+    if len(token) > 3 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+class RelevanceClassifier:
+
+    def __init__(self, snapshot, entity_values):
+        self.version = snapshot.version
+        self.table_terms = set()
+        self.column_terms = set()
+        for table in snapshot.tables.values():
+            self.table_terms.update(stem(part) for part in table.name.lower().split("_"))
+            for column in table.column_names:
+                for part in column.lower().split("_"):
+                    if part not in GENERIC_COLUMNS:
+                        self.column_terms.add(stem(part))
+
+        #full entity values ("pizza margherita") are strong, their single words ("pizza") are weak
+        self.entity_phrases = set()
+        self.entity_words = set()
+        for values in entity_values.values():
+            for value in values:
+                words = tokenize(value)
+                if not words:
+                    continue
+                self.entity_phrases.add(" ".join(words))
+                self.entity_words.update(stem(word) for word in words if word not in STOPWORDS)
+
+    def score(self, question):
+        tokens = tokenize(question)
+        stems = {stem(token) for token in tokens}
+        padded = f" {' '.join(tokens)} "
+        score = 0
+        if stems & self.table_terms:
+            score += STRONG
+        if any(f" {phrase} " in padded for phrase in self.entity_phrases):
+            score += STRONG
+        elif stems & self.entity_words:
+            score += WEAK
+        if stems & self.column_terms:
+            score += WEAK
+        return score, tokens
+
+    #"relevant", "not_relevant" or None when the LLM has to decide
+    def classify(self, question):
+        score, tokens = self.score(question)
+        if score >= STRONG:
+            return "relevant"
+        if score == 0 and not set(tokens) & DATA_INTENT_WORDS:
+            return "not_relevant"
+        return None
+
+
+class ClassifierStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.relevant = 0
+        self.not_relevant = 0
+        self.deferred = 0
+
+    def record(self, verdict):
+        with self._lock:
+            if verdict == "relevant":
+                self.relevant += 1
+            elif verdict == "not_relevant":
+                self.not_relevant += 1
+            else:
+                self.deferred += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.relevant + self.not_relevant + self.deferred
+            decided = self.relevant + self.not_relevant
+            return {
+                "relevant": self.relevant,
+                "not_relevant": self.not_relevant,
+                "deferred_to_llm": self.deferred,
+                "llm_calls_saved_rate": decided / total if total else 0.0,
+            }
+
+
+classifier_stats = ClassifierStats()
+PRECLASSIFIER_ENABLED = os.environ.get("RELEVANCE_PRECLASSIFIER", "1") != "0"
+
+_classifiers = {}   #engine url -> RelevanceClassifier
+_classifiers_lock = threading.Lock()
+
+
+#rebuilt whenever the schema version or the sampled entity values change
+def get_classifier(engine):
+    key = str(engine.url)
+    snapshot = get_schema(engine)
+    values = get_entity_values(engine)
+    cached = _classifiers.get(key)
+    if cached is not None and cached[0] is values and cached[1].version == snapshot.version:
+        return cached[1]
+    classifier = RelevanceClassifier(snapshot, values)
+    with _classifiers_lock:
+        _classifiers[key] = (values, classifier)
+    return classifier
+
+
+def preclassify(engine, question):
+    if not PRECLASSIFIER_ENABLED:
+        return None
+    verdict = get_classifier(engine).classify(question)
+    classifier_stats.record(verdict)
+    return verdict
+
+
+#compare local verdicts with the labels and count how many LLM calls would be skipped
+def benchmark(engine, labeled_questions):
+    classifier = get_classifier(engine)
+    decided = correct = 0
+    mistakes = []
+    for question, label in labeled_questions:
+        verdict = classifier.classify(question)
+        if verdict is None:
+            continue
+        decided += 1
+        if verdict == label:
+            correct += 1
+        else:
+            mistakes.append((question, label, verdict))
+    total = len(labeled_questions)
+    return {
+        "questions": total,
+        "decided_locally": decided,
+        "llm_calls_before": total,
+        "llm_calls_after": total - decided,
+        "llm_call_reduction": decided / total if total else 0.0,
+        "accuracy_when_decided": correct / decided if decided else 0.0,
+        "mistakes": mistakes,
+    }
+
+
+if __name__ == "__main__":
+    from sql_connection import engine
+    from corpus import LABELED_QUESTIONS
+
+    for name, value in benchmark(engine, LABELED_QUESTIONS).items():
+        print(f"{name}: {value}")
@@ -0,0 +1,124 @@
+#LRU cache of SELECT results keyed by normalized SQL text and bound parameters
+#entries are tagged with a data version: our own write counter (bumped by execute_sql)
+#plus SQLite's PRAGMA data_version, which changes whenever another connection commits
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from sql_text import normalize_sql
+
+
+class DataVersion:
+
+    def __init__(self, engine):
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._probe = None
+        #a dedicated connection that never writes, so every commit elsewhere moves its data_version
+        if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            self._probe = sqlite3.connect(engine.url.database, check_same_thread=False)
+
+    def bump(self):
+        with self._lock:
+            self.writes += 1
+
+    def current(self):
+        with self._lock:
+            if self._probe is None:
+                return (self.writes, None)
+            return (self.writes, self._probe.execute("PRAGMA data_version").fetchone()[0])
+
+
+class ResultCache:
+
+    def __init__(self, max_entries=128, max_rows=200000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()   #key -> (data version, ResultSet)
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    #database is the engine URL, so switching databases never serves another file's rows
+    @staticmethod
+    def key(sql, params=None, database=""):
+        return database, normalize_sql(sql), tuple(sorted((params or {}).items()))
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != version:
+                self._drop(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, rows):
+        if not self.enabled or len(rows) > self.max_rows:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, rows)
+            self._rows += len(rows)
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, rows = self._entries.pop(key)
+        self._rows -= len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "128")),
+    max_rows=int(os.environ.get("RESULT_CACHE_MAX_ROWS", "200000")),
+)
+
+_versions = {}  #engine url -> DataVersion
+_versions_lock = threading.Lock()
+
+
+def data_version(engine):
+    key = str(engine.url)
+    version = _versions.get(key)
+    if version is None:
+        with _versions_lock:
+            version = _versions.setdefault(key, DataVersion(engine))
+    return version
+
+
+def result_cache_stats():
+    return result_cache.stats()
@@ -0,0 +1,130 @@
+#compact columnar container for query results (AgentState["query_rows"])
+#column names are stored once, values live in per-column lists or numpy arrays
+#dict rows are only built on demand, for prompts, templates and JSON output
+
+import numpy as np
+
+
+#numpy dtype for a column, None when it has to stay a Python list (text, nulls, mixed types)
+def column_dtype(values):
+    if not values:
+        return None
+    if all(type(value) is int for value in values):
+        return np.int64 if all(-2**63 <= value < 2**63 for value in values) else None
+    if all(type(value) in (int, float) for value in values):
+        return np.float64
+    return None
+
+
+#SELECT u.name, f.name reports "name" twice, repeats become name_1, name_2 so no column is lost
+def unique_columns(columns):
+    seen = set(columns)
+    result = []
+    used = set()
+    for name in columns:
+        if name in used:
+            suffix = 1
+            while f"{name}_{suffix}" in seen:
+                suffix += 1
+            name = f"{name}_{suffix}"
+            seen.add(name)
+        used.add(name)
+        result.append(name)
+    return tuple(result)
+
+
+class ResultSet:
+
+    __slots__ = ("columns", "data", "row_count", "truncated")
+
+    def __init__(self, columns=(), data=None, row_count=0, truncated=False):
+        self.columns = tuple(columns)
+        self.data = data if data is not None else {name: [] for name in self.columns}
+        self.row_count = row_count
+        self.truncated = truncated
+
+    #build from row tuples: transpose once, then pack numeric columns into numpy arrays
+    @classmethod
+    def from_tuples(cls, columns, rows, truncated=False):
+        columns = unique_columns(columns)
+        if rows:
+            transposed = [list(values) for values in zip(*rows)]
+        else:
+            transposed = [[] for _ in columns]
+        data = {}
+        for name, values in zip(columns, transposed):
+            dtype = column_dtype(values)
+            data[name] = np.array(values, dtype=dtype) if dtype is not None else values
+        return cls(columns, data, len(rows), truncated)
+
+    @classmethod
+    def from_dicts(cls, rows, truncated=False):
+        if not rows:
+            return cls(truncated=truncated)
+        columns = tuple(rows[0].keys())
+        return cls.from_tuples(columns, [tuple(row.get(name) for name in columns) for row in rows], truncated)
+
+    def __len__(self):
+        return self.row_count
+
+    def __bool__(self):
+        return self.row_count > 0
+
+    def value(self, column, index):
+        value = self.data[column][index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def row(self, index):
+        if index < 0:
+            index += self.row_count
+        if not 0 <= index < self.row_count:
+            raise IndexError("row index out of range")
+        return {name: self.value(name, index) for name in self.columns}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(self.row_count))]
+        return self.row(index)
+
+    def __iter__(self):
+        for index in range(self.row_count):
+            yield self.row(index)
+
+    def column(self, name):
+        return self.data[name]
+
+    #plain Python lists per column (numpy arrays converted), for summaries and dataframes
+    def column_lists(self):
+        return {
+            name: values.tolist() if isinstance(values, np.ndarray) else list(values)
+            for name, values in self.data.items()
+        }
+
+    def rows(self):
+        return list(self)
+
+    #header once, then one line per row: much smaller than a list of dicts in a prompt
+    def to_text(self, limit=None):
+        count = self.row_count if limit is None else min(limit, self.row_count)
+        lines = [" | ".join(self.columns)]
+        for index in range(count):
+            lines.append(" | ".join(str(self.value(name, index)) for name in self.columns))
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "columns": list(self.columns),
+            "row_count": self.row_count,
+            "truncated": self.truncated,
+            "data": self.column_lists(),
+        }
+
+    def __repr__(self):
+        return f"ResultSet(columns={list(self.columns)}, rows={self.row_count}, truncated={self.truncated})"
+
+    def __eq__(self, other):
+        if isinstance(other, ResultSet):
+            return self.columns == other.columns and self.rows() == other.rows()
+        if isinstance(other, list):
+            return self.rows() == other
+        return NotImplemented
@@ -0,0 +1,75 @@
+#condense large query results before they are sent to the answer LLM
+#column statistics, top values / group counts and sample rows computed locally with numpy over the ResultSet columns
+#the summary fits a token budget, the full ResultSet stays in state["query_rows"] for the caller
+
+import os
+import numpy as np
+
+
+RESULT_TOKEN_BUDGET = int(os.environ.get("RESULT_TOKEN_BUDGET", "2000"))
+
+
+#rough count (about four characters per token), good enough to keep prompts in budget
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def is_numeric(values):
+    return all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+
+
+def column_summary(name, values, top_n):
+    #numeric columns already arrive as numpy arrays without nulls from the ResultSet
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+        present, nulls = values, 0
+    else:
+        data = np.asarray(values, dtype=object)
+        present = data[data != None]  # noqa: E711 - elementwise None check on an object array
+        nulls = len(data) - len(present)
+    if len(present) == 0:
+        return f"- {name}: all {nulls} values are null"
+
+    if present.dtype.kind in "iuf" or is_numeric(present.tolist()):
+        numbers = present.astype(float)
+        line = (
+            f"- {name}: numeric, min {numbers.min():g}, max {numbers.max():g}, "
+            f"mean {numbers.mean():g}, sum {numbers.sum():g}"
+        )
+    else:
+        labels, counts = np.unique(present.astype(str), return_counts=True)
+        order = np.argsort(-counts, kind="stable")[:top_n]
+        top = ", ".join(f"{labels[i]} ({counts[i]})" for i in order)
+        line = f"- {name}: text, {len(labels)} distinct values, most common: {top}"
+    if nulls:
+        line += f", {nulls} nulls"
+    return line
+
+
+def render_summary(rows, top_n, sample_rows):
+    lines = [
+        f"Total rows: {len(rows)} (condensed summary, not every row is listed)",
+        f"Columns: {', '.join(rows.columns)}",
+        "Column statistics:",
+    ]
+    lines.extend(column_summary(name, rows.column(name), top_n) for name in rows.columns)
+    if sample_rows:
+        lines.append(f"First {sample_rows} rows:")
+        lines.extend(str(row) for row in rows[:sample_rows])
+    return "\n".join(lines)
+
+
+#None when the rows already fit the budget, otherwise a summary that does
+def condense_rows(rows, budget=RESULT_TOKEN_BUDGET):
+    #the prompt renders rows one per line, so a row count that can't fit skips rendering them all
+    if not rows or (len(rows) < budget and estimate_tokens(rows.to_text()) <= budget):
+        return None
+
+    top_n, sample_rows = 10, 20
+    while True:
+        summary = render_summary(rows, top_n, sample_rows)
+        if estimate_tokens(summary) <= budget or (top_n == 1 and sample_rows == 0):
+            return summary
+        if sample_rows:
+            sample_rows //= 2
+        else:
+            top_n = max(1, top_n // 2)
@@ -0,0 +1,136 @@
+#entry points for running questions through the compiled graph
+#run_query / arun_query handle one question, run_queries processes a batch concurrently
+
+import asyncio
+import threading
+import time
+import sql_validator
+from graph import get_app
+from result_set import ResultSet
+from translation_cache import translation_cache
+from metrics import record_question
+
+
+#attempts (SQL regenerations) per finished question
+class AttemptStats:
+
+    def __init__(self):
+        self.questions = 0
+        self.attempts = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def record(self, state):
+        with self._lock:
+            self.questions += 1
+            self.attempts += state.get("attempts", 0)
+            if state.get("sql_error"):
+                self.failed += 1
+
+    def reset(self):
+        with self._lock:
+            self.questions = self.attempts = self.failed = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "questions": self.questions,
+                "attempts": self.attempts,
+                "failed": self.failed,
+                "average_attempts": self.attempts / self.questions if self.questions else 0.0,
+            }
+
+
+attempt_stats = AttemptStats()
+
+
+def initial_state(question):
+    return {
+        "question": question,
+        "sql_query": "",
+        "query_result": "",
+        "query_rows": ResultSet(),
+        "current_user": "",
+        "current_user_id": None,
+        "attempts": 0,
+        "relevance": "",
+        "sql_error": False,
+        "sql_error_message": "",
+        "translation_key": "",
+        "translation_hit": False,
+        "sql_params": {},
+        "template": "",
+        "rows_affected": 0,
+        "result_summary": "",
+        "truncated": False,
+        "guard_status": "",
+        "guard_message": "",
+    }
+
+
+def run_config(user_id=None):
+    # Only set user_id if explicitly provided
+    config = {"configurable": {}}
+    if user_id:
+        config["configurable"]["current_user_id"] = user_id
+    return config
+
+
+#returns the final graph state, the answer is in result["query_result"]
+#mode selects the graph variant (see graph.GRAPH_MODES), defaults to GRAPH_MODE
+#recovery switches failed queries to parallel candidate generation, defaults to RECOVERY_MODE
+def run_query(question, user_id=None, mode=None, recovery=None):
+    start = time.perf_counter()
+    state = get_app(mode, recovery).invoke(initial_state(question), config=run_config(user_id))
+    attempt_stats.record(state)
+    record_question(state, time.perf_counter() - start)
+    return state
+
+
+async def arun_query(question, user_id=None, mode=None, recovery=None):
+    start = time.perf_counter()
+    state = await get_app(mode, recovery).ainvoke(initial_state(question), config=run_config(user_id))
+    attempt_stats.record(state)
+    record_question(state, time.perf_counter() - start)
+    return state
+
+
+#final states in the same order as the questions, at most max_concurrency graphs in flight
+async def arun_queries(questions, user_ids=None, max_concurrency=4, return_exceptions=False, mode=None, recovery=None):
+    if user_ids is None:
+        user_ids = [None] * len(questions)
+    if len(user_ids) != len(questions):
+        raise ValueError("user_ids must have one entry per question.")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(question, user_id):
+        async with semaphore:
+            return await arun_query(question, user_id, mode, recovery)
+
+    return await asyncio.gather(
+        *(run_one(question, user_id) for question, user_id in zip(questions, user_ids)),
+        return_exceptions=return_exceptions,
+    )
+
+
+def run_queries(questions, user_ids=None, max_concurrency=4, return_exceptions=False, mode=None, recovery=None):
+    return asyncio.run(arun_queries(questions, user_ids, max_concurrency, return_exceptions, mode, recovery))
+
+
+#average attempts per question for the same batch without and with pre-execution validation
+#the translation cache is cleared before each pass so every question is translated again,
+#both passes execute the SQL, so use read-only questions
+def measure_attempts(questions, user_ids=None, max_concurrency=4, mode=None, recovery=None):
+    enabled = sql_validator.VALIDATION_ENABLED
+    report = {}
+    try:
+        for label, validation in (("without_validation", False), ("with_validation", True)):
+            sql_validator.VALIDATION_ENABLED = validation
+            translation_cache.clear()
+            attempt_stats.reset()
+            run_queries(questions, user_ids, max_concurrency, return_exceptions=True, mode=mode, recovery=recovery)
+            report[label] = attempt_stats.stats()
+    finally:
+        sql_validator.VALIDATION_ENABLED = enabled
+    return report
@@ -0,0 +1,180 @@
+#build the database schema once and keep it for every node
+#rebuild only when a DDL change is detected (SQLite schema_version pragma)
+#holds the rendered prompt text plus structured table/column metadata
+#also samples distinct values of text columns (user names, food names) for local matching
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import inspect
+from metrics import log
+
+
+@dataclass(frozen=True)
+class ColumnInfo:
+    name: str
+    type: str
+    primary_key: bool = False
+    foreign_key: Optional[str] = None   #"table.column" the column points to
+
+
+@dataclass(frozen=True)
+class TableInfo:
+    name: str
+    columns: tuple
+    indexes: tuple = ()     #tuple of column-name tuples that already have an index
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+    @property
+    def text_columns(self):
+        return [column.name for column in self.columns if is_text_type(column.type)]
+
+
+@dataclass(frozen=True)
+class SchemaSnapshot:
+    version: str
+    tables: dict    #table name -> TableInfo
+    text: str       #rendered schema used in the LLM prompts
+
+
+def is_text_type(type_name):
+    type_name = type_name.upper()
+    return any(marker in type_name for marker in ("CHAR", "TEXT", "STRING", "CLOB"))
+
+
+#read the DDL version of the database, None when the dialect has no cheap way to tell
+def read_schema_version(engine):
+    if engine.dialect.name != "sqlite":
+        return None
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA schema_version").scalar()
+
+
+#prompt text for a set of tables, the full schema and pruned subsets share this format
+def render_tables(tables):
+    schema = ""
+    for table in tables:
+        schema += f"Table: {table.name}\n"
+        for column in table.columns:
+            col_type = column.type
+            if column.primary_key:
+                col_type += ", Primary Key"
+            if column.foreign_key:
+                col_type += f", Foreign Key to {column.foreign_key}"
+            schema += f"- {column.name}: {col_type}\n"
+        schema += "\n"
+    return schema
+
+
+#walk every table once and render the prompt text in the same format as before
+def build_snapshot(engine, version=None):
+    inspector = inspect(engine)
+    tables = {}
+    for table_name in inspector.get_table_names():
+        foreign_keys = {}
+        for fk in inspector.get_foreign_keys(table_name):
+            for local, remote in zip(fk["constrained_columns"], fk["referred_columns"]):
+                foreign_keys[local] = f"{fk['referred_table']}.{remote}"
+
+        columns = tuple(
+            ColumnInfo(
+                name=column["name"],
+                type=str(column["type"]),
+                primary_key=bool(column.get("primary_key")),
+                foreign_key=foreign_keys.get(column["name"]),
+            )
+            for column in inspector.get_columns(table_name)
+        )
+        indexes = tuple(tuple(index["column_names"]) for index in inspector.get_indexes(table_name))
+        tables[table_name] = TableInfo(name=table_name, columns=columns, indexes=indexes)
+
+    return SchemaSnapshot(version=str(version), tables=tables, text=render_tables(tables.values()))
+
+
+#distinct values of every text column, capped per column so huge tables stay cheap
+def sample_entity_values(engine, snapshot, per_column=200):
+    values = {}
+    with engine.connect() as conn:
+        for table in snapshot.tables.values():
+            for column in table.text_columns:
+                rows = conn.exec_driver_sql(
+                    f'SELECT DISTINCT "{column}" FROM "{table.name}" WHERE "{column}" IS NOT NULL LIMIT {int(per_column)}'
+                ).fetchall()
+                values[(table.name, column)] = tuple(str(row[0]) for row in rows)
+    return values
+
+
+class SchemaCatalog:
+
+    def __init__(self, values_ttl=300.0, values_per_column=200):
+        self._snapshots = {}    #engine url -> SchemaSnapshot
+        self._values = {}       #engine url -> (schema version, sampled_at, values)
+        self._lock = threading.Lock()
+        self.values_ttl = values_ttl
+        self.values_per_column = values_per_column
+
+    def get(self, engine):
+        key = str(engine.url)
+        version = read_schema_version(engine)
+        snapshot = self._snapshots.get(key)
+        #dialects without a version pragma keep the first build until invalidate() is called
+        if snapshot is not None and (version is None or snapshot.version == str(version)):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or (version is not None and snapshot.version != str(version)):
+                snapshot = build_snapshot(engine, version)
+                self._snapshots[key] = snapshot
+                log("Retrieved database schema.")
+        return snapshot
+
+    #data changes more often than DDL, so sampled values also expire after values_ttl seconds
+    def entity_values(self, engine):
+        key = str(engine.url)
+        snapshot = self.get(engine)
+        cached = self._values.get(key)
+        if cached is not None and cached[0] == snapshot.version and time.monotonic() - cached[1] < self.values_ttl:
+            return cached[2]
+
+        values = sample_entity_values(engine, snapshot, self.values_per_column)
+        with self._lock:
+            self._values[key] = (snapshot.version, time.monotonic(), values)
+        return values
+
+    def invalidate(self, engine=None):
+        with self._lock:
+            if engine is None:
+                self._snapshots.clear()
+                self._values.clear()
+            else:
+                self._snapshots.pop(str(engine.url), None)
+                self._values.pop(str(engine.url), None)
+
+
+#process-wide catalog shared by the graph nodes and the UI
+catalog = SchemaCatalog(
+    values_ttl=float(os.environ.get("ENTITY_VALUES_TTL", "300")),
+    values_per_column=int(os.environ.get("ENTITY_VALUES_PER_COLUMN", "200")),
+)
+
+
+def get_schema(engine):
+    return catalog.get(engine)
+
+
+def get_schema_text(engine):
+    return catalog.get(engine).text
+
+
+def get_entity_values(engine):
+    return catalog.entity_values(engine)
+
+
+def invalidate_schema(engine=None):
+    catalog.invalidate(engine)
@@ -0,0 +1,138 @@
+#schema pruning: pick only the tables a question needs for the LLM prompts
+#tables are scored by keyword overlap plus a local character-trigram vector similarity
+#the top-k tables are expanded with their foreign-key neighbours so joins stay possible
+
+import math
+import os
+import threading
+from collections import Counter
+from schema_catalog import get_schema, get_entity_values, render_tables
+from relevance_classifier import tokenize, stem, STOPWORDS
+
+
+TOP_K = int(os.environ.get("SCHEMA_TOP_K", "5"))
+#when nothing in the question matches, schemas up to this size are sent whole
+FULL_SCHEMA_MAX_TABLES = int(os.environ.get("SCHEMA_FULL_MAX_TABLES", "30"))
+VECTOR_WEIGHT = 2.0
+#trigram overlap below this is noise ("weather" vs "users")
+MIN_SIMILARITY = 0.2
+
+
+def trigram_vector(text):
+    vector = Counter()
+    for word in text.split():
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[padded[i:i + 3]] += 1
+    return vector
+
+
+def cosine(left, right):
+    if not left or not right:
+        return 0.0
+    if len(left) > len(right):
+        left, right = right, left
+    dot = sum(count * right.get(gram, 0) for gram, count in left.items())
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(v * v for v in left.values())) * math.sqrt(sum(v * v for v in right.values()))
+    return dot / norm
+
+
+class SchemaIndex:
+
+    def __init__(self, snapshot, entity_values, top_k=TOP_K):
+        self.snapshot = snapshot
+        self.top_k = top_k
+        self.terms = {}         #table -> {stemmed term: weight}
+        self.vectors = {}       #table -> trigram vector of its names
+        self.neighbours = {name: set() for name in snapshot.tables}
+        document_frequency = Counter()
+
+        for table in snapshot.tables.values():
+            terms = {}
+            for part in table.name.lower().split("_"):
+                terms[stem(part)] = 3.0
+            for column in table.columns:
+                for part in column.name.lower().split("_"):
+                    terms.setdefault(stem(part), 1.0)
+                if column.foreign_key:
+                    target = column.foreign_key.split(".")[0]
+                    if target in self.neighbours:
+                        self.neighbours[table.name].add(target)
+                        self.neighbours[target].add(table.name)
+            #known values ("alice", "lasagne") point at the table that holds them
+            for (value_table, _), values in entity_values.items():
+                if value_table != table.name:
+                    continue
+                for value in values:
+                    for word in tokenize(value):
+                        if word not in STOPWORDS:
+                            terms.setdefault(stem(word), 2.0)
+            self.terms[table.name] = terms
+            document_frequency.update(terms.keys())
+            names = " ".join([table.name] + table.column_names).replace("_", " ").lower()
+            self.vectors[table.name] = trigram_vector(names)
+
+        #rare terms identify a table better than ones shared by many tables
+        total = max(len(snapshot.tables), 1)
+        self.idf = {term: math.log(1 + total / count) for term, count in document_frequency.items()}
+
+    def scores(self, question):
+        stems = {stem(token) for token in tokenize(question) if token not in STOPWORDS}
+        question_vector = trigram_vector(" ".join(sorted(stems)))
+        scores = {}
+        for name, terms in self.terms.items():
+            keyword = sum(terms[term] * self.idf[term] for term in stems if term in terms)
+            similarity = cosine(question_vector, self.vectors[name])
+            scores[name] = keyword + (VECTOR_WEIGHT * similarity if similarity >= MIN_SIMILARITY else 0.0)
+        return scores
+
+    def select_tables(self, question):
+        tables = self.snapshot.tables
+        if len(tables) <= self.top_k:
+            return list(tables)
+
+        scores = self.scores(question)
+        ranked = [name for name, score in sorted(scores.items(), key=lambda item: -item[1]) if score > 0]
+        if not ranked:
+            if len(tables) <= FULL_SCHEMA_MAX_TABLES:
+                return list(tables)
+            #no signal at all, fall back to the best connected tables
+            ranked = sorted(tables, key=lambda name: -len(self.neighbours[name]))
+
+        selected = ranked[:self.top_k]
+        for name in list(selected):
+            for neighbour in sorted(self.neighbours[name]):
+                if neighbour not in selected:
+                    selected.append(neighbour)
+        #keep the catalog order so prompts for similar questions look alike
+        return [name for name in tables if name in selected]
+
+    def schema_text(self, question):
+        tables = self.select_tables(question)
+        if len(tables) == len(self.snapshot.tables):
+            return self.snapshot.text
+        return render_tables(self.snapshot.tables[name] for name in tables)
+
+
+_indexes = {}   #engine url -> (entity values, SchemaIndex)
+_indexes_lock = threading.Lock()
+
+
+#rebuilt with the schema catalog version and the sampled entity values
+def get_schema_index(engine):
+    key = str(engine.url)
+    snapshot = get_schema(engine)
+    values = get_entity_values(engine)
+    cached = _indexes.get(key)
+    if cached is not None and cached[0] is values and cached[1].snapshot is snapshot:
+        return cached[1]
+    index = SchemaIndex(snapshot, values)
+    with _indexes_lock:
+        _indexes[key] = (values, index)
+    return index
+
+
+def get_schema_for_question(engine, question):
+    return get_schema_index(engine).schema_text(question)
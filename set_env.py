@@ -1,25 +1,34 @@
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from llm_registry import configure_llms, get_llm
+from llm_cache import llm_cache_from_env
+from metrics import log
 
 
-def setup_environment():
+def setup_environment(model='gpt-3.5-turbo', max_tokens=1000, models=None, llm_factory=None, llm_cache=None):
     
     #env file 
     load_dotenv()
     
-    #check OAI key
-    if not os.environ.get('OPENAI_API_KEY'):
+    #check OAI key (not needed when a local fake model factory is supplied)
+    if llm_factory is None and not os.environ.get('OPENAI_API_KEY'):
         raise ValueError("OPENAI_API_KEY not found. Please add it to your .env file.")
     
     #LangChain & Tavily keys
     if os.environ.get('LANGCHAIN_API_KEY'):
         os.environ["LANGCHAIN_TRACING_V2"] = "false"
         os.environ["LANGCHAIN_PROJECT"] = "langchain-academy"
-        print("LangChain tracing enabled.")
+        log("LangChain tracing enabled.")
         os.environ['TAVILY_API_KEY']
     else:
-        print("LangChain API key not found. Tracing will be disabled.")
+        log("LangChain API key not found. Tracing will be disabled.")
     
-    #llm defined
-    return ChatOpenAI(model='gpt-3.5-turbo', temperature=0, max_tokens=1000)
\ No newline at end of file
+    #opt-in persistent response cache (LLM_CACHE_PATH in .env)
+    if llm_cache is None:
+        llm_cache = llm_cache_from_env()
+        if llm_cache is not None:
+            log(f"LLM response cache enabled at {llm_cache.path}.")
+
+    #shared clients used by every graph node
+    configure_llms(model=model, max_tokens=max_tokens, models=models, factory=llm_factory, llm_cache=llm_cache)
+    return get_llm("default", 0)
\ No newline at end of file
@@ -0,0 +1,84 @@
+#speculative execution: start SQL generation while the relevance check is still running
+#the SQL branch is cancelled (async) or discarded (sync) when the verdict is not_relevant
+#counters show how often the speculation was wasted
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SpeculationStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.speculations = 0
+        self.used = 0       #verdict relevant, the speculative SQL was kept
+        self.wasted = 0     #verdict not_relevant, the SQL branch was thrown away
+        self.cancelled = 0  #wasted branches stopped before they finished
+
+    def record(self, used, cancelled=False):
+        with self._lock:
+            self.speculations += 1
+            if used:
+                self.used += 1
+            else:
+                self.wasted += 1
+                if cancelled:
+                    self.cancelled += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "speculations": self.speculations,
+                "used": self.used,
+                "wasted": self.wasted,
+                "cancelled": self.cancelled,
+                "wasted_rate": self.wasted / self.speculations if self.speculations else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.speculations = self.used = self.wasted = self.cancelled = 0
+
+
+speculation_stats = SpeculationStats()
+
+#worker threads for the speculative SQL branch of the sync graph
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SPECULATION_WORKERS", "8")),
+    thread_name_prefix="speculative-sql",
+)
+
+
+#returns (relevance_result, sql_result), sql_result is None when the question is not relevant
+def run_speculative(relevance_call, sql_call, is_relevant):
+    sql_future = _executor.submit(sql_call)
+    relevance = relevance_call()
+    if is_relevant(relevance):
+        speculation_stats.record(used=True)
+        return relevance, sql_future.result()
+
+    #a running thread can not be stopped, its result is simply ignored
+    speculation_stats.record(used=False, cancelled=sql_future.cancel())
+    return relevance, None
+
+
+async def arun_speculative(relevance_call, sql_call, is_relevant):
+    sql_task = asyncio.ensure_future(sql_call())
+    try:
+        relevance = await relevance_call()
+    except BaseException:
+        sql_task.cancel()
+        raise
+    if is_relevant(relevance):
+        speculation_stats.record(used=True)
+        return relevance, await sql_task
+
+    cancelled = not sql_task.done()
+    if cancelled:
+        sql_task.cancel()
+    elif not sql_task.cancelled():
+        sql_task.exception()    #mark a failed discarded branch as retrieved
+    speculation_stats.record(used=False, cancelled=cancelled)
+    return relevance, None
@@ -2,7 +2,7 @@
 #enable basic database functionality
 
 import os
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Float
+from sqlalchemy import create_engine, event, make_url, Column, Integer, String, ForeignKey, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
@@ -44,12 +44,111 @@ class Order(Base):
 
 
 #relative path to SQL and the database name
-DATABASE_URL = "sqlite:///example.db"
-
-#handle connection
-engine = create_engine(DATABASE_URL)
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///example.db")
+
+#SQLite connection profile, applied to every new pooled connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),   #readers no longer block behind the writer
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),  #safe with WAL, one fsync per checkpoint
+    "cache_size": os.environ.get("SQLITE_CACHE_SIZE", "-65536"),    #negative = KiB, 64 MB page cache
+    "mmap_size": os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "busy_timeout": os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"),  #ms to wait for a lock instead of "database is locked"
+}
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", "10"))
+
+
+def is_file_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+#pysqlite only opens a transaction before DML and lets DDL autocommit, so a failed plan could keep
+#its CREATE TABLE; the driver's transaction handling is switched off and every transaction starts with BEGIN
+def explicit_transactions(db_engine):
+
+    @event.listens_for(db_engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(db_engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+#engine with the SQLite pragmas and an explicit pool, read_only connections refuse writes (query_only)
+#pragmas overrides single entries of SQLITE_PRAGMAS
+def create_db_engine(url=None, read_only=False, pool_size=None, max_overflow=None, pragmas=None):
+    url = url or DATABASE_URL
+    if not is_file_sqlite(url):
+        db_engine = create_engine(url)
+        if db_engine.dialect.name == "sqlite":
+            explicit_transactions(db_engine)
+        return db_engine
+
+    pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+    db_engine = create_engine(
+        url,
+        pool_size=pool_size or (READ_POOL_SIZE if read_only else POOL_SIZE),
+        max_overflow=MAX_OVERFLOW if max_overflow is None else max_overflow,
+        connect_args={"check_same_thread": False, "timeout": int(pragmas["busy_timeout"]) / 1000},
+    )
+
+    @event.listens_for(db_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    explicit_transactions(db_engine)
+    return db_engine
+
+
+#handle connection, writes (and plans that mix reads and writes) use engine
+engine = create_db_engine(DATABASE_URL)
+#SELECT-only work goes to a separate read-only pool, in-memory databases share the write engine
+read_engine = create_db_engine(DATABASE_URL, read_only=True) if is_file_sqlite(DATABASE_URL) else engine
 #create new database objects
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+#current engines, modules that must follow configure_database() look them up here
+def get_engine():
+    return engine
+
+
+def get_read_engine():
+    return read_engine
+
+
+#point the application at another database, existing session factories are rebound
+def configure_database(url=None):
+    global DATABASE_URL, engine, read_engine
+    url = url or os.environ.get("DATABASE_URL", DATABASE_URL)
+    if url == DATABASE_URL:
+        return engine
+    old_engines = {engine, read_engine}
+    DATABASE_URL = url
+    engine = create_db_engine(url)
+    read_engine = create_db_engine(url, read_only=True) if is_file_sqlite(url) else engine
+    SessionLocal.configure(bind=engine)
+    ReadSessionLocal.configure(bind=read_engine)
+    for old_engine in old_engines:
+        old_engine.dispose()
+    return engine
+
+
+#False for a SQLite file that has not been created yet, other databases are assumed to exist
+def database_exists():
+    url = make_url(DATABASE_URL)
+    if is_file_sqlite(DATABASE_URL):
+        return os.path.exists(url.database)
+    return True
 
 
 
@@ -91,7 +190,7 @@ def init_db():
 
 
 if __name__ == "__main__":
-    if not os.path.exists("example.db"):
+    if not database_exists():
         init_db()
     else:
         print(".")
\ No newline at end of file
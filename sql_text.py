@@ -0,0 +1,162 @@
+#small helpers for working with generated SQL text
+#quoted literals and identifiers are left untouched by every transformation here
+
+import re
+
+
+#splits SQL into (is_quoted, chunk) pieces so callers only rewrite the unquoted parts
+def quoted_chunks(sql):
+    return [(bool(match.group(1)), match.group(0)) for match in re.finditer(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|[^'\"]+|['\"]", sql)]
+
+
+#whitespace collapsed and trailing semicolons dropped, so equivalent statements share cache keys
+def normalize_sql(sql):
+    pieces = []
+    for quoted, chunk in quoted_chunks(sql.strip()):
+        pieces.append(chunk if quoted else re.sub(r"\s+", " ", chunk))
+    return "".join(pieces).strip().rstrip(";").strip()
+
+
+TOKEN_PATTERN = re.compile(
+    r"""(?P<space>\s+|--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<number>\d+(?:\.\d*)?)
+    |(?P<symbol>\S)""",
+    re.S | re.X,
+)
+
+
+#(kind, text) tokens without whitespace and comments, kind is string/quoted/word/number/symbol
+def tokenize_sql(sql):
+    return [
+        (match.lastgroup, match.group(0))
+        for match in TOKEN_PATTERN.finditer(sql)
+        if match.lastgroup != "space"
+    ]
+
+
+#identifier text without quoting, lowercased for catalog lookups
+def identifier(token):
+    kind, value = token
+    if kind == "quoted":
+        value = value[1:-1]
+    return value.lower()
+
+
+#statements of a SQL script, split on semicolons outside string literals, quoted identifiers and comments
+#comments are dropped, CREATE TRIGGER bodies (BEGIN ... END;) stay in one statement
+def split_statements(sql):
+    statements = []
+    pieces = []
+    words = []      #leading words of the current statement, to recognize triggers
+    in_trigger = False
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind, value = match.lastgroup, match.group(0)
+        if kind == "space":
+            pieces.append(" " if value.startswith(("--", "/*")) else value)
+            continue
+        if kind == "word":
+            word = value.lower()
+            if len(words) < 4:
+                words.append(word)
+                if words[0] == "create" and word == "trigger":
+                    in_trigger = True
+            if in_trigger and word == "end":
+                in_trigger = False
+        if value == ";" and not in_trigger:
+            statements.append("".join(pieces).strip())
+            pieces, words = [], []
+            continue
+        pieces.append(value)
+    statements.append("".join(pieces).strip())
+    return [stmt for stmt in statements if stmt]
+
+
+#INSERT INTO table (columns) VALUES (literals) -> (template with :p0.. placeholders, parameter dict)
+#None for anything else (several rows, expressions, bound parameters)
+def literal_insert(stmt):
+    tokens = tokenize_sql(stmt)
+    words = [value.lower() for _, value in tokens[:2]]
+    if words != ["insert", "into"] or "values" not in [value.lower() for kind, value in tokens if kind == "word"]:
+        return None
+    split = next(i for i, (kind, value) in enumerate(tokens) if kind == "word" and value.lower() == "values")
+    head, tail = tokens[:split], tokens[split + 1:]
+    if len(head) < 3 or len(tail) < 2 or tail[0][1] != "(" or tail[-1][1] != ")":
+        return None
+
+    values = []
+    items = tail[1:-1]
+    position = 0
+    while position < len(items):
+        kind, value = items[position]
+        if kind == "symbol" and value == "-" and position + 1 < len(items) and items[position + 1][0] == "number":
+            position += 1
+            number = items[position][1]
+            values.append(-(float(number) if "." in number else int(number)))
+        elif kind == "number":
+            values.append(float(value) if "." in value else int(value))
+        elif kind == "string":
+            values.append(value[1:-1].replace("''", "'"))
+        elif kind == "word" and value.lower() == "null":
+            values.append(None)
+        else:
+            return None
+        position += 1
+        if position < len(items):
+            if items[position][1] != "," or position + 1 == len(items):
+                return None
+            position += 1
+
+    placeholders = ", ".join(f":p{i}" for i in range(len(values)))
+    template = " ".join(value for _, value in head) + f" VALUES ({placeholders})"
+    return template, {f"p{i}": value for i, value in enumerate(values)}
+
+
+#consecutive literal INSERTs with the same shape become one (template, [params, ...]) batch for executemany
+#every other statement comes back as (statement, None)
+def group_inserts(statements):
+    groups = []
+    for stmt in statements:
+        insert = literal_insert(stmt)
+        if insert is not None and groups and groups[-1][1] is not None and groups[-1][0] == insert[0]:
+            groups[-1][1].append(insert[1])
+        elif insert is not None:
+            groups.append((insert[0], [insert[1]], stmt))
+        else:
+            groups.append((stmt, None, stmt))
+    #a single INSERT runs as written
+    return [(template, batch) if batch is not None and len(batch) > 1 else (stmt, None) for template, batch, stmt in groups]
+
+
+#words that start the main part of a statement once its WITH clause is skipped
+STATEMENT_VERBS = {"select", "insert", "replace", "update", "delete", "values"}
+
+
+#main verb of a statement, lowercased: WITH ... SELECT is "select", WITH ... DELETE is "delete"
+#the first word for anything else, "" for empty text
+def statement_verb(stmt):
+    tokens = tokenize_sql(stmt)
+    index = 0
+    while index < len(tokens) and tokens[index][1] == "(":
+        index += 1
+    if index < len(tokens) and tokens[index][1].lower() == "with":
+        depth = 0
+        while index < len(tokens):
+            kind, value = tokens[index]
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            elif depth == 0 and kind == "word" and value.lower() in STATEMENT_VERBS:
+                break
+            index += 1
+    if index < len(tokens) and tokens[index][0] == "word":
+        return tokens[index][1].lower()
+    return ""
+
+
+#reads run on the read pool, go through the cost guard and may be cached, everything else is a write
+def is_read(stmt):
+    return statement_verb(stmt) == "select"
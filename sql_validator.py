@@ -0,0 +1,199 @@
+#validate generated SQL before it runs
+#table and column references are checked against the schema catalog, then the database compiles
+#each statement with EXPLAIN inside a transaction that is always rolled back
+#the error text is fed back into the SQL regeneration prompt instead of a blind retry
+
+import os
+import threading
+from sqlalchemy import text
+from sql_connection import ReadSessionLocal
+from schema_catalog import get_schema
+from sql_text import tokenize_sql, identifier, split_statements
+
+
+VALIDATION_ENABLED = os.environ.get("SQL_VALIDATION", "1") != "0"
+
+#keywords after which a table name follows
+TABLE_KEYWORDS = {"from", "join", "into", "update", "table"}
+
+#words that end a table reference, so they are never taken for an alias
+CLAUSE_WORDS = {
+    "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on", "using",
+    "group", "order", "limit", "offset", "having", "union", "except", "intersect", "set", "values",
+    "select", "default", "returning", "window", "as", "exists", "if", "not",
+}
+
+
+class ValidationStats:
+
+    def __init__(self):
+        self.validated = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record(self, ok):
+        with self._lock:
+            self.validated += 1
+            if not ok:
+                self.rejected += 1
+
+    def stats(self):
+        with self._lock:
+            return {"validated": self.validated, "rejected": self.rejected}
+
+
+validation_stats = ValidationStats()
+
+
+def is_name(token):
+    return token[0] in ("word", "quoted")
+
+
+#table name -> set of aliases, plus names that are defined inside the query (CTEs, derived tables)
+def table_references(tokens):
+    tables = {}
+    derived = set()
+    for index, token in enumerate(tokens):
+        #WITH name AS ( ... ) and ", name AS (" define CTEs
+        if (
+            is_name(token)
+            and index + 2 < len(tokens)
+            and identifier(tokens[index + 1]) == "as"
+            and tokens[index + 2][1] == "("
+        ):
+            derived.add(identifier(token))
+
+    index = 0
+    while index < len(tokens):
+        if tokens[index][0] != "word" or tokens[index][1].lower() not in TABLE_KEYWORDS:
+            index += 1
+            continue
+        #ON CONFLICT ... DO UPDATE SET updates the insert's own table, no table name follows
+        if index > 0 and identifier(tokens[index]) == "update" and identifier(tokens[index - 1]) == "do":
+            index += 1
+            continue
+        index += 1
+        #CREATE TABLE IF NOT EXISTS name
+        while index < len(tokens) and identifier(tokens[index]) in ("if", "not", "exists"):
+            index += 1
+        while index < len(tokens):
+            if tokens[index][1] == "(":
+                #derived table, its alias (if any) is not a catalog table
+                depth, index = 1, index + 1
+                while index < len(tokens) and depth:
+                    depth += {"(": 1, ")": -1}.get(tokens[index][1], 0)
+                    index += 1
+                if index < len(tokens) and identifier(tokens[index]) == "as":
+                    index += 1
+                if index < len(tokens) and is_name(tokens[index]) and identifier(tokens[index]) not in CLAUSE_WORDS:
+                    derived.add(identifier(tokens[index]))
+                    index += 1
+            elif is_name(tokens[index]):
+                name = identifier(tokens[index])
+                index += 1
+                #schema-qualified name: main.users
+                if index + 1 < len(tokens) and tokens[index][1] == "." and is_name(tokens[index + 1]):
+                    name = identifier(tokens[index + 1])
+                    index += 2
+                aliases = tables.setdefault(name, set())
+                if index < len(tokens) and identifier(tokens[index]) == "as":
+                    index += 1
+                if index < len(tokens) and is_name(tokens[index]) and identifier(tokens[index]) not in CLAUSE_WORDS:
+                    aliases.add(identifier(tokens[index]))
+                    index += 1
+            else:
+                break
+            #comma joins: FROM a, b
+            if index < len(tokens) and tokens[index][1] == ",":
+                index += 1
+                continue
+            break
+    return tables, derived
+
+
+#column names listed after INSERT INTO table ( ... )
+def insert_columns(tokens):
+    for index, token in enumerate(tokens):
+        if token[0] == "word" and token[1].lower() == "into" and index + 2 < len(tokens):
+            if is_name(tokens[index + 1]) and tokens[index + 2][1] == "(":
+                columns = []
+                position = index + 3
+                while position < len(tokens) and tokens[position][1] != ")":
+                    if is_name(tokens[position]):
+                        columns.append(identifier(tokens[position]))
+                    position += 1
+                return identifier(tokens[index + 1]), columns
+    return None, []
+
+
+#first problem found in a statement, None when every reference resolves
+def check_references(stmt, snapshot):
+    known = {name.lower(): {column.lower() for column in table.column_names} for name, table in snapshot.tables.items()}
+    tokens = tokenize_sql(stmt)
+    tables, derived = table_references(tokens)
+    creates = bool(tokens) and identifier(tokens[0]) == "create"
+
+    resolve = {}
+    for name, aliases in tables.items():
+        if name in derived or name.startswith("sqlite_"):
+            continue
+        if name not in known:
+            if creates:
+                continue
+            return f"no such table: {name}. Available tables: {', '.join(sorted(known))}"
+        resolve[name] = name
+        for alias in aliases:
+            resolve[alias] = name
+
+    for index in range(len(tokens) - 2):
+        qualifier, dot, column = tokens[index], tokens[index + 1], tokens[index + 2]
+        if not (is_name(qualifier) and dot[1] == "." and is_name(column)):
+            continue
+        table = resolve.get(identifier(qualifier))
+        if table is not None and identifier(column) not in known[table]:
+            return (
+                f"no such column: {qualifier[1]}.{column[1]}. "
+                f"Columns of {table}: {', '.join(sorted(known[table]))}"
+            )
+
+    table, columns = insert_columns(tokens)
+    if table in known:
+        for column in columns:
+            if column not in known[table]:
+                return f"table {table} has no column named {column}. Columns of {table}: {', '.join(sorted(known[table]))}"
+    return None
+
+
+#let the database compile every statement without running it, nothing is ever committed
+def explain_statements(statements, params=None):
+    session = ReadSessionLocal()
+    try:
+        for stmt in statements:
+            session.execute(text(f"EXPLAIN {stmt}"), params or {})
+    finally:
+        session.rollback()
+        session.close()
+
+
+#None when the SQL is valid, otherwise the error message for the regeneration prompt
+def validate_sql(engine, sql, params=None):
+    statements = split_statements(sql)
+    if not statements:
+        return "empty SQL query"
+    snapshot = get_schema(engine)
+    for stmt in statements:
+        error = check_references(stmt, snapshot)
+        if error is not None:
+            return error
+    #later statements can depend on tables created earlier in the same plan, the catalog check covers those
+    if any(identifier(tokenize_sql(stmt)[0]) in ("create", "drop", "alter") for stmt in statements):
+        return None
+    try:
+        explain_statements(statements, params)
+    except Exception as e:
+        return str(getattr(e, "orig", None) or e)
+    return None
+
+
+def sql_validation_stats():
+    return validation_stats.stats()
@@ -1,5 +1,7 @@
+from typing import Optional
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
+from result_set import ResultSet
 
 
 
@@ -8,11 +10,22 @@ class AgentState(TypedDict):
     question: str
     sql_query: str
     query_result: str
-    query_rows: list
+    query_rows: ResultSet
     current_user: str
+    current_user_id: Optional[int]
     attempts: int
     relevance: str
     sql_error: bool
+    sql_error_message: str
+    translation_key: str
+    translation_hit: bool
+    sql_params: dict
+    template: str
+    rows_affected: int
+    result_summary: str
+    truncated: bool
+    guard_status: str
+    guard_message: str
 
 
 class GetCurrentUser(BaseModel):
@@ -34,5 +47,14 @@ class ConvertToSQL(BaseModel):
     )
 
 
+class CheckRelevanceAndConvertToSQL(BaseModel):
+    relevance: str = Field(
+        description="Indicates whether the question is related to the database schema. 'relevant' or 'not_relevant'."
+    )
+    sql_query: str = Field(
+        description="The SQL query corresponding to the user's natural language question. Empty when the question is not relevant."
+    )
+
+
 class RewrittenQuestion(BaseModel):
     question: str = Field(description="The rewritten question.")
\ No newline at end of file
@@ -1,9 +1,13 @@
-import os
 import streamlit as st
 from dotenv import load_dotenv
-from sql_connection import init_db
+from sql_connection import init_db, configure_database, database_exists, get_engine
 from set_env import setup_environment
 from graph import workflow, app
+import runner
+from query_guard import fetch_page, QueryRejected, QueryTimeout
+from answer_renderer import sql_kind
+from sql_text import split_statements
+from user_context import USER_LIST_LIMIT, get_user_context, list_users
 
 # Page configuration
 st.set_page_config(
@@ -15,8 +19,9 @@ st.set_page_config(
 # Load environment variables
 load_dotenv()
 
-# Initialize database if needed
-if not os.path.exists("example.db"):
+# Initialize database if needed (DATABASE_URL may come from .env)
+configure_database()
+if not database_exists():
     init_db()
     st.success("Database initialized successfully!")
 
@@ -27,26 +32,17 @@ except ValueError as e:
     st.error(f"Error: {str(e)}")
     st.stop()
 
+ROWS_PAGE_SIZE = 50
+
+
+def is_single_select(sql):
+    statements = split_statements(sql)
+    return len(statements) == 1 and sql_kind(statements[0]) == "select"
+
 # Function to run a query (from main.py)
 def run_query(question, user_id=None):
-    initial_state = {
-        "question": question,
-        "sql_query": "",
-        "query_result": "",
-        "query_rows": [],
-        "current_user": "",
-        "attempts": 0,
-        "relevance": "",
-        "sql_error": False
-    }
-    
-    # Only set user_id if explicitly provided
-    config = {"configurable": {}}
-    if user_id:
-        config["configurable"]["current_user_id"] = user_id
-    
     with st.spinner("Processing your query..."):
-        result = app.invoke(initial_state, config=config)
+        result = runner.run_query(question, user_id)
     return result
 
 # Streamlit UI
@@ -63,21 +59,31 @@ with st.sidebar:
     
     user_id = None
     if user_option == "Specific user":
-        user_id = st.selectbox(
-            "Select user:",
-            options=[1, 2, 3],
-            format_func=lambda x: f"User ID: {x}"
-        )
+        users = {user.id: user.name for user in list_users()}
+        if len(users) < USER_LIST_LIMIT:
+            user_id = st.selectbox(
+                "Select user:",
+                options=list(users),
+                format_func=lambda x: f"{users[x]} (ID: {x})"
+            )
+        else:
+            # Too many users for a list, look the ID up instead
+            user_id = int(st.number_input("User ID:", min_value=1, step=1, value=next(iter(users))))
+            user = get_user_context(user_id)
+            if user is None:
+                st.warning(f"No user with ID {user_id}.")
+                user_id = None
+            else:
+                st.caption(f"Querying as {user.name} (ID: {user.id})")
     
     st.markdown("---")
     st.markdown("### Database Information")
     
     # Show database schema or structure
     if st.button("Show Database Schema"):
-        from tools import get_database_schema
-        from sql_connection import engine
+        from schema_catalog import get_schema_text
         
-        schema = get_database_schema(engine)
+        schema = get_schema_text(get_engine())
         st.code(schema)
     
     st.markdown("---")
@@ -99,12 +105,18 @@ with col1:
 # Debug options in an expander
 with st.expander("Debug Information", expanded=False):
     show_sql = st.checkbox("Show SQL Query")
+    show_rows = st.checkbox("Show Result Rows")
     show_full_state = st.checkbox("Show Full State")
 
 # Process the query when the button is clicked
 if run_button and query:
-    full_result = run_query(query, user_id)
-    
+    # Keep the last result across reruns so paging widgets don't lose it
+    st.session_state["last_result"] = run_query(query, user_id)
+elif run_button and not query:
+    st.warning("Please enter a question first.")
+
+full_result = st.session_state.get("last_result")
+if full_result:
     # Display the answer
     st.markdown("### Answer")
     st.markdown(full_result["query_result"])
@@ -114,9 +126,21 @@ if run_button and query:
         st.markdown("### SQL Query")
         st.code(full_result["sql_query"], language="sql")
     
+    # Page through the rows straight from the database instead of holding them all
+    if show_rows and is_single_select(full_result["sql_query"]) and not full_result.get("sql_error"):
+        st.markdown("### Result Rows")
+        page = st.number_input("Page", min_value=1, value=1, step=1) - 1
+        try:
+            rows = fetch_page(full_result["sql_query"], full_result.get("sql_params"), page, ROWS_PAGE_SIZE)
+        except (QueryRejected, QueryTimeout) as e:
+            st.error(f"Query stopped by the cost guard: {e}")
+        else:
+            if rows:
+                st.dataframe(rows)
+            else:
+                st.info("No rows on this page.")
+    
     # Show full state for debugging
     if show_full_state:
         st.markdown("### Full State")
-        st.json(full_result)
-elif run_button and not query:
-    st.warning("Please enter a question first.")
\ No newline at end of file
+        st.json({**full_result, "query_rows": full_result["query_rows"].to_dict()})
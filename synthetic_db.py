@@ -0,0 +1,175 @@
+#reproducible synthetic databases for load tests and benchmarks, from a few hundred to millions of rows
+#orders per user are log-normal (most users order a few times, a heavy tail of frequent customers),
+#foods get a Zipf-like popularity and log-normal prices, ages are roughly normal
+#rows are generated in chunks and bulk inserted with executemany, one transaction per table,
+#the model indexes are created after loading and ANALYZE runs at the end
+#python synthetic_db.py --users 1000000 --orders-per-user 5 --output synthetic.db
+
+import argparse
+import itertools
+import math
+import os
+import random
+import time
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable
+from metrics import log
+from sql_connection import Base, Food, Order, User, create_db_engine
+
+
+CHUNK_SIZE = 50000
+USER_ORDERS_SIGMA = 1.0    #log-normal sigma of orders per user, larger means a heavier tail
+FOOD_SKEW = 0.9     #Zipf exponent of food popularity
+
+FIRST_NAMES = (
+    "Alice", "Bob", "Charlie", "Dana", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas",
+    "Kara", "Liam", "Maya", "Noah", "Olga", "Pedro", "Quinn", "Rosa", "Sven", "Tara",
+    "Umar", "Vera", "Wei", "Ximena", "Yusuf", "Zoe", "Amir", "Bianca", "Chen", "Diego",
+)
+LAST_NAMES = (
+    "Smith", "Garcia", "Müller", "Rossi", "Kowalski", "Nguyen", "Tanaka", "Silva", "Novak", "Jensen",
+    "Dubois", "Kim", "Ivanova", "Okafor", "Haddad", "Larsen", "Moreau", "Costa", "Weber", "Singh",
+)
+DISHES = (
+    "Pizza Margherita", "Spaghetti Carbonara", "Lasagne", "Risotto", "Tiramisu", "Bruschetta",
+    "Minestrone", "Panna Cotta", "Gnocchi", "Ravioli", "Calzone", "Focaccia", "Ossobuco", "Caprese Salad",
+    "Penne Arrabbiata", "Pad Thai", "Ramen", "Sushi Platter", "Burrito", "Falafel Wrap",
+    "Chicken Curry", "Beef Burger", "Caesar Salad", "Fish and Chips", "Paella", "Moussaka",
+)
+STYLES = ("Classic", "Spicy", "Vegan", "Large", "Family", "Deluxe", "Mini", "Homemade", "Truffle", "Smoked")
+
+
+#cumulative weights of a Zipf-like distribution over n ranks, for random.choices
+def zipf_weights(n, skew):
+    return list(itertools.accumulate(1.0 / rank ** skew for rank in range(1, n + 1)))
+
+
+def food_names(count):
+    names = list(DISHES)
+    for style, dish in itertools.product(STYLES, DISHES):
+        names.append(f"{style} {dish}")
+    suffix = 2
+    while len(names) < count:
+        names.extend(f"{dish} No. {suffix}" for dish in DISHES)
+        suffix += 1
+    return names[:count]
+
+
+def user_rows(rng, users):
+    for user_id in range(1, users + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield user_id, f"{first} {last}", min(90, max(18, int(rng.gauss(38, 12)))), f"{first}.{last}.{user_id}@example.com".lower()
+
+
+def food_rows(rng, foods):
+    for food_id, name in enumerate(food_names(foods), start=1):
+        yield food_id, name, round(min(60.0, max(3.0, rng.lognormvariate(2.5, 0.4))), 2)
+
+
+#orders of one user, log-normal with the given mean, randomly rounded so small means still average out
+def order_count(rng, mean):
+    if mean <= 0:
+        return 0
+    value = rng.lognormvariate(math.log(mean) - USER_ORDERS_SIGMA ** 2 / 2, USER_ORDERS_SIGMA)
+    return int(value + rng.random())
+
+
+#every user draws an order count, the orders are shuffled so they do not cluster by user id
+#popular dishes are spread over random ids, not the lowest ones
+def order_rows(rng, users, foods, orders_per_user):
+    owners = []
+    for user_id in range(1, users + 1):
+        owners.extend([user_id] * order_count(rng, orders_per_user))
+    rng.shuffle(owners)
+    food_ids = list(range(1, foods + 1))
+    rng.shuffle(food_ids)
+    food_weights = zipf_weights(foods, FOOD_SKEW)
+    for start in range(0, len(owners), CHUNK_SIZE):
+        chunk_users = owners[start:start + CHUNK_SIZE]
+        chunk_foods = rng.choices(food_ids, cum_weights=food_weights, k=len(chunk_users))
+        for offset, (user_id, food_id) in enumerate(zip(chunk_users, chunk_foods)):
+            yield start + offset + 1, food_id, user_id
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+#one transaction per table, one DBAPI executemany per chunk of tuples
+#(the Core insert() path spends most of its time converting millions of parameter dicts)
+def bulk_load(connection, table, rows):
+    columns = [column.name for column in table.columns]
+    stmt = f'INSERT INTO "{table.name}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    count = 0
+    for chunk in chunks(rows):
+        connection.exec_driver_sql(stmt, chunk)
+        count += len(chunk)
+    return count
+
+
+#builds a new SQLite file at path and returns row counts and timings
+def generate_database(path, users=1000, orders_per_user=5.0, foods=200, seed=0, overwrite=False):
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f"{path} already exists, pass overwrite=True to replace it.")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    rng = random.Random(seed)
+    #durability does not matter while the file is being built
+    db_engine = create_db_engine(f"sqlite:///{path}", pool_size=1, max_overflow=0, pragmas={"synchronous": "OFF"})
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with db_engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                connection.execute(CreateTable(table))
+
+        counts = {}
+        for name, table, rows in (
+            ("users", User.__table__, user_rows(rng, users)),
+            ("food", Food.__table__, food_rows(rng, foods)),
+            ("orders", Order.__table__, order_rows(rng, users, foods, orders_per_user)),
+        ):
+            table_start = time.perf_counter()
+            with db_engine.begin() as connection:
+                counts[name] = bulk_load(connection, table, rows)
+            timings[name] = time.perf_counter() - table_start
+            log(f"Loaded {counts[name]} rows into {name} in {timings[name]:.2f}s.")
+
+        #building each index once over the loaded table is much cheaper than maintaining it per insert
+        index_start = time.perf_counter()
+        with db_engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(connection)
+            connection.execute(text("ANALYZE"))
+        timings["indexes"] = time.perf_counter() - index_start
+    finally:
+        db_engine.dispose()
+
+    timings["total"] = time.perf_counter() - start
+    log(f"Generated {path} in {timings['total']:.2f}s.")
+    return {"path": path, "seed": seed, "rows": counts, "seconds": timings}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic users/food/orders SQLite database.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--orders-per-user", type=float, default=5.0, help="mean of the log-normal orders per user")
+    parser.add_argument("--foods", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic.db")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing file")
+    args = parser.parse_args(argv)
+    generate_database(args.output, args.users, args.orders_per_user, args.foods, args.seed, args.overwrite)
+
+
+if __name__ == "__main__":
+    main()
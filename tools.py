@@ -4,385 +4,621 @@
 #generate human natural language response from the query
 
 # Add at the top
+import asyncio
+import time
 from states import AgentState
 from langchain_core.runnables.config import RunnableConfig
-from sql_connection import SessionLocal, User
+from sql_connection import SessionLocal, ReadSessionLocal, User
 from sqlalchemy import text
-from sql_connection import engine
-from sqlalchemy import inspect
-from states import CheckRelevance, ConvertToSQL, RewrittenQuestion
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from profile import get_current_user  # Import from profile
-
+from sql_connection import get_engine
+from schema_catalog import get_schema, get_schema_text
+from translation_cache import translation_cache, translation_key
+from speculation import run_speculative, arun_speculative
+from relevance_classifier import preclassify
+from schema_index import get_schema_for_question
+from query_templates import match_question
+from answer_renderer import try_render_answer
+from result_summary import condense_rows
+from query_stream import stream_statement, collect_rows
+from result_set import ResultSet
+from result_cache import result_cache, data_version
+from sql_text import split_statements, group_inserts, tokenize_sql, is_read
+from user_context import invalidate_users
+from metrics import metrics, log, COUNT_BUCKETS
+import sql_validator
+from sql_validator import table_references
+from query_guard import guard_select, statement_timeout, QueryRejected, QueryTimeout
+from index_advisor import record_statement, auto_apply_indexes
+from recovery import candidate_variants, dry_run, first_success, afirst_success
+from states import CheckRelevance, ConvertToSQL, CheckRelevanceAndConvertToSQL, RewrittenQuestion
+from llm_registry import get_chain
+from prompts import (
+    RELEVANCE_PROMPT,
+    SQL_USER_PROMPT,
+    SQL_DATABASE_PROMPT,
+    FUSED_USER_PROMPT,
+    FUSED_DATABASE_PROMPT,
+    ANSWER_PROMPTS,
+    REWRITE_PROMPT,
+    FUNNY_PROMPT,
+)
+
+#served from the schema catalog, only rebuilt when the DDL changes
 def get_database_schema(engine):
-    inspector = inspect(engine)
-    schema = ""
-    for table_name in inspector.get_table_names():
-        schema += f"Table: {table_name}\n"
-        for column in inspector.get_columns(table_name):
-            col_name = column["name"]
-            col_type = str(column["type"])
-            if column.get("primary_key"):
-                col_type += ", Primary Key"
-            if column.get("foreign_keys"):
-                fk = list(column["foreign_keys"])[0]
-                col_type += f", Foreign Key to {fk.column.table.name}.{fk.column.name}"
-            schema += f"- {col_name}: {col_type}\n"
-        schema += "\n"
-    print("Retrieved database schema.")
-    return schema
+    return get_schema_text(engine)
 
-def check_relevance(state: AgentState, config: RunnableConfig):
+def lookup_translation(state: AgentState):
+    state["translation_hit"] = False
+    if not translation_cache.enabled:
+        state["translation_key"] = ""
+        return state
+
+    key = translation_key(
+        state["question"], state["current_user"], get_schema(get_engine()).version, state.get("current_user_id")
+    )
+    state["translation_key"] = key
+    cached = translation_cache.get(key)
+    if cached is not None:
+        state["relevance"], state["sql_query"] = cached
+        state["translation_hit"] = True
+        log(f"Translation cache hit: {state['relevance']} {state['sql_query']}")
+    return state
+
+def is_relevant(relevance):
+    return relevance.relevance.lower() == "relevant"
+
+#frequent question shapes become parameterized SQL without any LLM call
+def match_template(state: AgentState):
+    state["template"] = ""
+    matched = match_question(get_engine(), state["question"], state["current_user"], state.get("current_user_id"))
+    if matched is not None:
+        state["template"], state["sql_query"], state["sql_params"] = matched
+        state["relevance"] = "relevant"
+        log(f"Matched query template '{state['template']}': {state['sql_query']} {state['sql_params']}")
+    return state
+
+#obvious questions are decided locally from schema names and known entity values
+def preclassified_relevance(state: AgentState):
+    verdict = preclassify(get_engine(), state["question"])
+    if verdict is None:
+        return None
+    log(f"Relevance pre-classified locally: {verdict}")
+    return CheckRelevance(relevance=verdict)
+
+def relevance_request(state: AgentState):
     question = state["question"]
-    schema = get_database_schema(engine)
-    print(f"Checking relevance of the question: {question}")
-    system = """You are an assistant that determines whether a given question is related to the following database schema.
-
-Schema:
-{schema}
-
-Respond with only "relevant" or "not_relevant".
-Consider questions about the database structure, users, food items, orders, or general database content as "relevant".
-""".format(schema=schema)
-    human = f"Question: {question}"
-    check_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            ("human", human),
-        ]
+    schema = get_schema_for_question(get_engine(), question)
+    log(f"Checking relevance of the question: {question}")
+    relevance_checker = get_chain(
+        "check_relevance", RELEVANCE_PROMPT, "relevance", 0, CheckRelevance, method="function_calling"
     )
-    llm = ChatOpenAI(temperature=0)
-    structured_llm = llm.with_structured_output(CheckRelevance, method='function_calling')
-    relevance_checker = check_prompt | structured_llm
-    relevance = relevance_checker.invoke({})
+    return relevance_checker, {"schema": schema, "question": question}
+
+def apply_relevance(state: AgentState, relevance):
     state["relevance"] = relevance.relevance
-    print(f"Relevance determined: {state['relevance']}")
+    log(f"Relevance determined: {state['relevance']}")
+    #irrelevant verdicts are final, relevant ones are cached once their SQL has run
+    if state.get("translation_key") and state["relevance"].lower() != "relevant":
+        translation_cache.put(state["translation_key"], state["relevance"])
     return state
 
-def convert_nl_to_sql(state: AgentState, config: RunnableConfig):
+def check_relevance(state: AgentState, config: RunnableConfig):
+    local = preclassified_relevance(state)
+    if local is not None:
+        return apply_relevance(state, local)
+    relevance_checker, inputs = relevance_request(state)
+    return apply_relevance(state, relevance_checker.invoke(inputs))
+
+async def acheck_relevance(state: AgentState, config: RunnableConfig):
+    local = preclassified_relevance(state)
+    if local is not None:
+        return apply_relevance(state, local)
+    relevance_checker, inputs = relevance_request(state)
+    return apply_relevance(state, await relevance_checker.ainvoke(inputs))
+
+def has_user_scope(current_user):
+    return bool(current_user) and current_user != "User not found" and current_user != "Error retrieving user"
+
+#the failed SQL and its error, appended to the question so the next attempt can fix it
+def error_feedback(state: AgentState):
+    if not state.get("sql_error_message"):
+        return ""
+    return (
+        f"\n\nThe previous SQL query failed.\nSQL: {state['sql_query']}\n"
+        f"Error: {state['sql_error_message']}\nWrite a corrected query."
+    )
+
+#temperature and hint vary the candidates of recovery mode
+def sql_request(state: AgentState, temperature=0, hint=""):
     question = state["question"]
     current_user = state["current_user"]
-    schema = get_database_schema(engine)
-    print(f"Converting question to SQL for user '{current_user}': {question}")
+    schema = get_schema_for_question(get_engine(), question)
+    log(f"Converting question to SQL for user '{current_user}': {question}")
     
     # Different system prompt based on whether we have a current user
-    if current_user and current_user != "User not found" and current_user != "Error retrieving user":
-        system = """You are an assistant that converts natural language questions into SQL queries based on the following schema:
+    if has_user_scope(current_user):
+        sql_generator = get_chain("convert_to_sql_user", SQL_USER_PROMPT, "sql", temperature, ConvertToSQL)
+        inputs = {
+            "schema": schema,
+            "current_user": current_user,
+            "current_user_id": state["current_user_id"],
+            "question": question,
+        }
+    else:
+        sql_generator = get_chain("convert_to_sql_database", SQL_DATABASE_PROMPT, "sql", temperature, ConvertToSQL)
+        inputs = {"schema": schema, "question": question}
+    inputs["feedback"] = error_feedback(state) + hint
+    return sql_generator, inputs
 
-{schema}
+def apply_sql(state: AgentState, result):
+    state["sql_query"] = result.sql_query
+    state["sql_params"] = {}
+    state["template"] = ""
+    log(f"Generated SQL query: {state['sql_query']}")
+    return state
 
-The current user is '{current_user}'. Unless the question is explicitly about all users or the entire database, ensure that all query-related data is scoped to this user.
+def convert_nl_to_sql(state: AgentState, config: RunnableConfig):
+    sql_generator, inputs = sql_request(state)
+    return apply_sql(state, sql_generator.invoke(inputs))
 
-IMPORTANT RULES:
-1. For user-specific queries, ensure data is scoped to this user using WHERE user_id = (SELECT id FROM users WHERE name = '{current_user}')
-2. For database-wide queries about all users/data, do NOT restrict to the current user
-3. For INSERT operations that specify both a user and related data (like an order), create multiple SQL statements as needed
-4. Alias columns appropriately to match expected keys (e.g., 'food.name' as 'food_name')
-5. For multiple SQL statements, separate them with a semicolon
+async def aconvert_nl_to_sql(state: AgentState, config: RunnableConfig):
+    sql_generator, inputs = sql_request(state)
+    return apply_sql(state, await sql_generator.ainvoke(inputs))
 
-Provide only the SQL query without any explanations.
-""".format(schema=schema, current_user=current_user)
-    else:
-        system = """You are an assistant that converts natural language questions into SQL queries based on the following schema:
+def fused_request(state: AgentState):
+    question = state["question"]
+    current_user = state["current_user"]
+    schema = get_schema_for_question(get_engine(), question)
+    log(f"Checking relevance and converting to SQL for user '{current_user}': {question}")
 
-{schema}
+    if has_user_scope(current_user):
+        fused_generator = get_chain(
+            "check_relevance_and_convert_user", FUSED_USER_PROMPT, "sql", 0, CheckRelevanceAndConvertToSQL
+        )
+        inputs = {
+            "schema": schema,
+            "current_user": current_user,
+            "current_user_id": state["current_user_id"],
+            "question": question,
+        }
+    else:
+        fused_generator = get_chain(
+            "check_relevance_and_convert_database", FUSED_DATABASE_PROMPT, "sql", 0, CheckRelevanceAndConvertToSQL
+        )
+        inputs = {"schema": schema, "question": question}
+    return fused_generator, inputs
 
-This is a database-wide query with no specific user context.
+def apply_fused(state: AgentState, result):
+    apply_relevance(state, result)
+    if state["relevance"].lower() == "relevant":
+        apply_sql(state, result)
+    return state
 
-IMPORTANT RULES:
-1. Process queries about the entire database appropriately
-2. For INSERT operations, create multiple SQL statements as needed
-3. Alias columns appropriately to match expected keys (e.g., 'food.name' as 'food_name')
-4. For multiple SQL statements, separate them with a semicolon
+#fused mode: a single structured call returns the relevance verdict and the SQL
+def check_relevance_and_convert(state: AgentState, config: RunnableConfig):
+    local = preclassified_relevance(state)
+    if local is not None and not is_relevant(local):
+        return apply_relevance(state, local)
+    fused_generator, inputs = fused_request(state)
+    return apply_fused(state, fused_generator.invoke(inputs))
+
+async def acheck_relevance_and_convert(state: AgentState, config: RunnableConfig):
+    local = preclassified_relevance(state)
+    if local is not None and not is_relevant(local):
+        return apply_relevance(state, local)
+    fused_generator, inputs = fused_request(state)
+    return apply_fused(state, await fused_generator.ainvoke(inputs))
+
+#speculative mode: SQL generation starts alongside the relevance check and is dropped if not relevant
+def speculate_relevance_and_sql(state: AgentState, config: RunnableConfig):
+    local = preclassified_relevance(state)
+    if local is not None:
+        apply_relevance(state, local)
+        return convert_nl_to_sql(state, config) if is_relevant(local) else state
+    relevance_checker, relevance_inputs = relevance_request(state)
+    sql_generator, sql_inputs = sql_request(state)
+    relevance, sql = run_speculative(
+        lambda: relevance_checker.invoke(relevance_inputs),
+        lambda: sql_generator.invoke(sql_inputs),
+        is_relevant,
+    )
+    apply_relevance(state, relevance)
+    if sql is not None:
+        apply_sql(state, sql)
+    return state
 
-Provide only the SQL query without any explanations.
-""".format(schema=schema)
-    
-    convert_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            ("human", "Question: {question}"),
-        ]
+async def aspeculate_relevance_and_sql(state: AgentState, config: RunnableConfig):
+    local = preclassified_relevance(state)
+    if local is not None:
+        apply_relevance(state, local)
+        return await aconvert_nl_to_sql(state, config) if is_relevant(local) else state
+    relevance_checker, relevance_inputs = relevance_request(state)
+    sql_generator, sql_inputs = sql_request(state)
+    relevance, sql = await arun_speculative(
+        lambda: relevance_checker.ainvoke(relevance_inputs),
+        lambda: sql_generator.ainvoke(sql_inputs),
+        is_relevant,
     )
-    llm = ChatOpenAI(temperature=0)
-    structured_llm = llm.with_structured_output(ConvertToSQL)
-    sql_generator = convert_prompt | structured_llm
-    result = sql_generator.invoke({"question": question})
-    state["sql_query"] = result.sql_query
-    print(f"Generated SQL query: {state['sql_query']}")
+    apply_relevance(state, relevance)
+    if sql is not None:
+        apply_sql(state, sql)
     return state
 
+#catalog check plus EXPLAIN in a rolled-back transaction, a bad query goes straight to regeneration
+def validate_sql(state: AgentState):
+    state["sql_error_message"] = ""
+    if not sql_validator.VALIDATION_ENABLED:
+        return state
+    error = sql_validator.validate_sql(get_engine(), state["sql_query"], state.get("sql_params"))
+    sql_validator.validation_stats.record(error is None)
+    if error is None:
+        state["sql_error"] = False
+        return state
+    state["query_result"] = f"Error validating SQL query: {error}"
+    state["sql_error"] = True
+    state["sql_error_message"] = error
+    log(f"SQL validation failed: {error}")
+    return state
+
+async def avalidate_sql(state: AgentState):
+    return await asyncio.to_thread(validate_sql, state)
+
+#a cached translation that fails on replay is dropped, the regenerated SQL is cached once it succeeds
+def forget_translation(state: AgentState):
+    if state.get("translation_hit"):
+        translation_cache.discard(state["translation_key"])
+        state["translation_hit"] = False
+        log("Dropped the cached translation after it failed.")
+
+#cached while the data version is unchanged, otherwise streamed under the row / byte cap
+#reads after uncommitted writes of the same plan are never cached
+def run_select(session, stmt, params, cacheable=True):
+    if not result_cache.enabled or not cacheable:
+        return collect_rows(stream_statement(session, stmt, params))
+    engine = get_engine()
+    key = result_cache.key(stmt, params, str(engine.url))
+    version = data_version(engine).current()
+    rows = result_cache.get(key, version)
+    if rows is not None:
+        metrics.inc("cache_hits", cache="result")
+        log("Result cache hit.")
+        return rows
+    rows = collect_rows(stream_statement(session, stmt, params))
+    result_cache.put(key, version, rows)
+    return rows
+
 def execute_sql(state: AgentState):
     sql_query = state["sql_query"].strip()
-    session = SessionLocal()
-    print(f"Executing SQL query: {sql_query}")
+    sql_params = state.get("sql_params") or {}
+    engine = get_engine()
+    # Split on semicolons outside literals and comments, the whole plan is one transaction
+    statements = split_statements(sql_query)
+    # Read-only plans use the read pool, anything that writes reads its own writes on the write pool
+    read_only = all(is_read(stmt) for stmt in statements)
+    session = ReadSessionLocal() if read_only else SessionLocal()
+    log(f"Executing SQL query: {sql_query}")
+    start = time.perf_counter()
     
     try:
-        # Handle multiple SQL statements separated by semicolons
-        statements = [stmt.strip() for stmt in sql_query.split(';') if stmt.strip()]
         results = []
+        rows_affected = 0
+        wrote = False
+        state["truncated"] = False
+        state["guard_status"] = ""
+        state["guard_message"] = ""
         
-        for stmt in statements:
-            if not stmt:
-                continue
+        # Runs of same-shaped literal INSERTs come back as one executemany batch
+        for stmt, batch in group_inserts(statements):
+            if batch is not None:
+                with statement_timeout(session, engine):
+                    result = session.execute(text(stmt), batch)
+                rows_affected += max(result.rowcount, 0)
+                wrote = True
+                results.append({"message": f"Successfully executed {len(batch)} times: {stmt}"})
                 
-            result = session.execute(text(stmt))
-            
-            if stmt.lower().startswith("select"):
-                rows = result.fetchall()
-                columns = result.keys()
+            elif is_read(stmt):
+                # Cost guard: reject cartesian plans, bound the row count, enforce the timeout
+                stmt = guard_select(session, engine, stmt, sql_params)
+                statement_start = time.perf_counter()
+                with statement_timeout(session, engine):
+                    rows = run_select(session, stmt, sql_params, cacheable=not wrote)
+                # Shape, timing and plan for the index advisor
+                record_statement(session, engine, stmt, sql_params, time.perf_counter() - statement_start)
+                if rows.truncated:
+                    state["truncated"] = True
+                    state["guard_status"] = "truncated"
+                    state["guard_message"] = f"the result was truncated to the first {len(rows)} rows"
+                    log(f"Result truncated after {len(rows)} rows.")
                 
                 if rows:
-                    query_result = {
-                        "columns": columns,
-                        "rows": [dict(zip(columns, row)) for row in rows]
-                    }
-                    results.append(query_result)
+                    results.append({"columns": rows.columns, "rows": rows})
                     
                     # Store the last SELECT result for the response formatting
-                    state["query_rows"] = [dict(zip(columns, row)) for row in rows]
+                    state["query_rows"] = rows
                 else:
                     results.append({"message": "No results found for this query."})
                     if len(statements) == 1:  # Only set if this is the only statement
-                        state["query_rows"] = []
+                        state["query_rows"] = rows
             else:
-                # For non-SELECT statements, commit after each statement
-                session.commit()
+                with statement_timeout(session, engine):
+                    result = session.execute(text(stmt), sql_params)
+                rows_affected += max(result.rowcount, 0)
+                wrote = True
                 results.append({"message": f"Successfully executed: {stmt}"})
         
+        # One commit for the whole plan
+        if wrote:
+            session.commit()
+            data_version(engine).bump()
+            if any("users" in table_references(tokenize_sql(stmt))[0] for stmt in statements if not is_read(stmt)):
+                invalidate_users()
+        
         # Format overall result
         if len(results) == 1 and "columns" in results[0]:
             # Single SELECT statement with results
             columns = results[0]["columns"]
             rows = results[0]["rows"]
             header = ", ".join(columns)
-            data = "; ".join([f"{row.get('food_name', row.get('name', list(row.values())[0]))}" 
-                             for row in rows])
+            label = next((name for name in ("food_name", "name") if name in columns), columns[0])
+            data = "; ".join(str(rows.value(label, i)) for i in range(len(rows)))
             state["query_result"] = f"{header}\n{data}"
         else:
             # Multiple statements or non-SELECT
             state["query_result"] = "All operations completed successfully."
             
+        state["rows_affected"] = rows_affected
         state["sql_error"] = False
-        print("SQL query executed successfully.")
+        state["sql_error_message"] = ""
+        row_count = len(state.get("query_rows") or ())
+        metrics.observe("sql_rows", row_count, buckets=COUNT_BUCKETS)
+        metrics.observe("sql_rows_affected", rows_affected, buckets=COUNT_BUCKETS)
+        log("SQL query executed successfully.", rows=row_count, rows_affected=rows_affected)
+        #template SQL carries bound parameters and is already cheap, only LLM translations are cached
+        if state.get("translation_key") and not state.get("translation_hit") and not state.get("template"):
+            translation_cache.put(state["translation_key"], "relevant", state["sql_query"])
         
+    except (QueryRejected, QueryTimeout) as e:
+        state["query_result"] = f"Query stopped by the cost guard: {str(e)}"
+        state["sql_error"] = True
+        state["sql_error_message"] = str(e)
+        state["guard_status"] = "rejected" if isinstance(e, QueryRejected) else "aborted"
+        state["guard_message"] = str(e)
+        log(f"Query stopped by the cost guard: {str(e)}")
+        session.rollback()
+        forget_translation(state)
     except Exception as e:
+        # Nothing of a failed plan is kept, so a retry does not duplicate earlier writes
+        session.rollback()
         state["query_result"] = f"Error executing SQL query: {str(e)}"
         state["sql_error"] = True
-        print(f"Error executing SQL query: {str(e)}")
+        state["sql_error_message"] = str(getattr(e, "orig", None) or e)
+        log(f"Error executing SQL query: {str(e)}")
+        forget_translation(state)
     finally:
         session.close()
+        metrics.observe("sql_seconds", time.perf_counter() - start, status="error" if state.get("sql_error") else "ok")
+    # Opt-in (INDEX_ADVISOR_AUTO_APPLY): indexes are created only once no session of this plan is open
+    auto_apply_indexes(engine)
     return state
 
-def generate_human_readable_answer(state: AgentState):
+#large results are condensed to fit the answer prompt budget, the full rows stay in query_rows
+def condense_results(state: AgentState):
+    summary = condense_rows(state.get("query_rows") or ResultSet())
+    state["result_summary"] = summary or ""
+    if summary:
+        log(f"Condensed {len(state['query_rows'])} rows into a summary for the answer prompt.")
+    return state
+
+#the SQLite driver is blocking, so the async graph runs it on a worker thread
+async def aexecute_sql(state: AgentState):
+    return await asyncio.to_thread(execute_sql, state)
+
+def answer_request(state: AgentState):
     sql = state["sql_query"]
     result = state["query_result"]
-    current_user = state["current_user"]
-    query_rows = state.get("query_rows", [])
+    query_rows = state.get("query_rows") or ResultSet()
     sql_error = state.get("sql_error", False)
     question = state["question"]
-    print("Generating a human-readable answer.")
+    log("Generating a human-readable answer.")
     
+    if state.get("result_summary") and not sql_error:
+        # Too many rows for the prompt, answer from the condensed summary
+        variant, inputs = "results", {"sql": sql, "query_rows": state["result_summary"], "question": question}
     # Special handling for database-wide queries
-    if sql.lower().startswith("select") and "from users" in sql.lower() and not "where" in sql.lower():
+    elif is_read(sql) and "from users" in sql.lower() and not "where" in sql.lower():
         # This is a query about all users
-        system = """You are an assistant that converts SQL query results into clear, natural language responses.
-        Respond appropriately to queries about the database as a whole.
-        """
-        
         if query_rows:
             # Format the names of users
-            names = [row.get('name', '') for row in query_rows if row.get('name')]
-            names_str = ", ".join(names)
-            
-            generate_prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", system),
-                    (
-                        "human",
-                        f"""SQL Query:
-{sql}
-
-Result:
-{names_str}
-
-Original Question: {question}
-
-Formulate a clear answer that lists all users in the database."""
-                    ),
-                ]
-            )
+            names = [str(name) for name in query_rows.column("name") if name] if "name" in query_rows.columns else []
+            variant, inputs = "all_users", {"sql": sql, "names": ", ".join(names), "question": question}
         else:
-            generate_prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", system),
-                    (
-                        "human",
-                        f"""SQL Query:
-{sql}
-
-Result:
-No results found.
-
-Original Question: {question}
-
-Formulate a clear answer stating that there are no users in the database."""
-                    ),
-                ]
-            )
+            variant, inputs = "no_users", {"sql": sql, "question": question}
     elif sql_error:
         # Error handling
-        system = """You are an assistant that converts SQL query results into clear, natural language responses.
-        """
-        generate_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", system),
-                (
-                    "human",
-                    f"""SQL Query:
-{sql}
-
-Result:
-{result}
-
-Formulate a clear error message informing the user about the issue."""
-                ),
-            ]
-        )
-    elif sql.lower().startswith("select"):
+        variant, inputs = "error", {"sql": sql, "result": result}
+    elif is_read(sql):
         if not query_rows:
             # Handle cases with no results
-            system = """You are an assistant that converts SQL query results into clear, natural language responses.
-            """
-            generate_prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", system),
-                    (
-                        "human",
-                        f"""SQL Query:
-{sql}
-
-Result:
-No results found.
-
-Original Question: {question}
-
-Formulate a response indicating that no results were found for this query."""
-                    ),
-                ]
-            )
+            variant, inputs = "no_results", {"sql": sql, "question": question}
         else:
             # Handle normal query results
-            system = """You are an assistant that converts SQL query results into clear, natural language responses.
-            """
-            generate_prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", system),
-                    (
-                        "human",
-                        f"""SQL Query:
-{sql}
-
-Results:
-{query_rows}
-
-Original Question: {question}
-
-Formulate a clear and understandable answer to the original question based on these results."""
-                    ),
-                ]
-            )
+            variant, inputs = "results", {"sql": sql, "query_rows": query_rows.to_text(), "question": question}
     else:
         # Handle non-select queries (INSERT, UPDATE, etc.)
-        system = """You are an assistant that converts SQL query results into clear, natural language responses.
-        """
-        generate_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", system),
-                (
-                    "human",
-                    f"""SQL Query:
-{sql}
-
-Result:
-{result}
-
-Original Question: {question}
-
-Formulate a confirmation message stating that the requested action has been completed successfully."""
-                ),
-            ]
-        )
+        variant, inputs = "confirmation", {"sql": sql, "result": result, "question": question}
+
+    human_response = get_chain(f"answer_{variant}", ANSWER_PROMPTS[variant], "answer", 0)
+    return human_response, inputs
 
-    llm = ChatOpenAI(temperature=0)
-    human_response = generate_prompt | llm | StrOutputParser()
-    answer = human_response.invoke({})
+def apply_answer(state: AgentState, answer):
+    if state.get("truncated"):
+        answer += f"\n\n(The result was truncated to the first {len(state.get('query_rows') or [])} rows.)"
     state["query_result"] = answer
-    print("Generated human-readable answer.")
+    log("Generated human-readable answer.")
     return state
 
-def regenerate_query(state: AgentState):
-    question = state["question"]
-    print("Regenerating the SQL query by rewriting the question.")
-    system = """You are an assistant that reformulates an original question to enable more precise SQL queries. Ensure that all necessary details, such as table joins, are preserved to retrieve complete and accurate data.
-    """
-    rewrite_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            (
-                "human",
-                f"Original Question: {question}\nReformulate the question to enable more precise SQL queries, ensuring all necessary details are preserved.",
-            ),
-        ]
-    )
-    llm = ChatOpenAI(temperature=0)
-    structured_llm = llm.with_structured_output(RewrittenQuestion)
-    rewriter = rewrite_prompt | structured_llm
-    rewritten = rewriter.invoke({})
+#simple result shapes are answered locally, only complex results reach the LLM
+def local_answer(state: AgentState):
+    rendered = try_render_answer(state)
+    if rendered is None:
+        return None
+    log(f"Rendered '{rendered[0]}' answer locally.")
+    return rendered[1]
+
+def generate_human_readable_answer(state: AgentState):
+    answer = local_answer(state)
+    if answer is not None:
+        return apply_answer(state, answer)
+    human_response, inputs = answer_request(state)
+    return apply_answer(state, human_response.invoke(inputs))
+
+async def agenerate_human_readable_answer(state: AgentState):
+    answer = local_answer(state)
+    if answer is not None:
+        return apply_answer(state, answer)
+    human_response, inputs = answer_request(state)
+    return apply_answer(state, await human_response.ainvoke(inputs))
+
+def rewrite_request(state: AgentState):
+    log("Regenerating the SQL query by rewriting the question.")
+    rewriter = get_chain("regenerate_query", REWRITE_PROMPT, "rewrite", 0, RewrittenQuestion)
+    return rewriter, {"question": state["question"], "feedback": error_feedback(state)}
+
+def apply_rewrite(state: AgentState, rewritten):
     state["question"] = rewritten.question
     state["attempts"] += 1
-    print(f"Rewritten question: {state['question']}")
+    log(f"Rewritten question: {state['question']}")
     return state
 
-def generate_funny_response(state: AgentState):
-    print("Generating a funny response for an unrelated question.")
-    system = """You are a charming and funny assistant who responds in a playful manner.
-    """
-    human_message = "I can not help with that, but doesn't asking questions make you hungry? You can always order something delicious."
-    funny_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            ("human", human_message),
-        ]
-    )
-    llm = ChatOpenAI(temperature=0.7)
-    funny_response = funny_prompt | llm | StrOutputParser()
-    message = funny_response.invoke({})
+def regenerate_query(state: AgentState):
+    rewriter, inputs = rewrite_request(state)
+    return apply_rewrite(state, rewriter.invoke(inputs))
+
+async def aregenerate_query(state: AgentState):
+    rewriter, inputs = rewrite_request(state)
+    return apply_rewrite(state, await rewriter.ainvoke(inputs))
+
+#recovery mode: one round generates several candidates concurrently and keeps the first that passes
+#validation and a dry run, each round counts as one attempt against the check_attempts_router cap
+def start_recovery(state: AgentState):
+    state["attempts"] += 1
+    if check_attempts_router(state) == "end_max_iterations":
+        return None
+    log(f"Recovering the SQL query, round {state['attempts']}.")
+    return [sql_request(state, temperature, hint) for temperature, hint in candidate_variants()]
+
+def apply_recovery(state: AgentState, sql, error):
+    state["sql_query"] = sql
+    state["sql_params"] = {}
+    state["template"] = ""
+    if error is None:
+        state["sql_error"] = False
+        state["sql_error_message"] = ""
+        log(f"Recovered SQL query: {sql}")
+    else:
+        state["query_result"] = f"Error validating SQL query: {error}"
+        state["sql_error"] = True
+        state["sql_error_message"] = error
+        log(f"No recovery candidate passed: {error}")
+    return state
+
+def candidate_call(sql_generator, inputs, sql_params=None):
+    def call():
+        sql = sql_generator.invoke(inputs).sql_query
+        return sql, dry_run(get_engine(), sql, sql_params)
+    return call
+
+def acandidate_call(sql_generator, inputs, sql_params=None):
+    async def call():
+        sql = (await sql_generator.ainvoke(inputs)).sql_query
+        return sql, await asyncio.to_thread(dry_run, get_engine(), sql, sql_params)
+    return call
+
+def recover_sql(state: AgentState, config: RunnableConfig):
+    requests = start_recovery(state)
+    if requests is None:
+        return state
+    sql, error = first_success([candidate_call(generator, inputs) for generator, inputs in requests])
+    return apply_recovery(state, sql, error)
+
+async def arecover_sql(state: AgentState, config: RunnableConfig):
+    requests = start_recovery(state)
+    if requests is None:
+        return state
+    sql, error = await afirst_success([acandidate_call(generator, inputs) for generator, inputs in requests])
+    return apply_recovery(state, sql, error)
+
+def funny_request(state: AgentState):
+    log("Generating a funny response for an unrelated question.")
+    return get_chain("generate_funny_response", FUNNY_PROMPT, "funny", 0.7), {}
+
+def apply_funny(state: AgentState, message):
     state["query_result"] = message
-    print("Generated funny response.")
+    log("Generated funny response.")
     return state
 
+def generate_funny_response(state: AgentState):
+    funny_response, inputs = funny_request(state)
+    return apply_funny(state, funny_response.invoke(inputs))
+
+async def agenerate_funny_response(state: AgentState):
+    funny_response, inputs = funny_request(state)
+    return apply_funny(state, await funny_response.ainvoke(inputs))
+
 def end_max_iterations(state: AgentState):
-    state["query_result"] = "Please try again."
-    print("Maximum attempts reached. Ending the workflow.")
+    if state.get("guard_status") in ("rejected", "aborted"):
+        state["query_result"] = f"The query was stopped because {state['guard_message']} Please try again with a narrower question."
+    else:
+        state["query_result"] = "Please try again."
+    log("Maximum attempts reached. Ending the workflow.")
     return state
 
+def translation_cache_router(state: AgentState):
+    if not state.get("translation_hit"):
+        return "match_template"
+    if state["relevance"].lower() == "relevant":
+        return "execute_sql"
+    return "generate_funny_response"
+
+def template_router(state: AgentState):
+    if state.get("template"):
+        return "execute_sql"
+    return "check_relevance"
+
 def relevance_router(state: AgentState):
     if state["relevance"].lower() == "relevant":
         return "convert_to_sql"
     else:
         return "generate_funny_response"
 
+def fused_router(state: AgentState):
+    if state["relevance"].lower() != "relevant":
+        return "generate_funny_response"
+    #the fused call said relevant but produced no SQL, fall back to the dedicated generator
+    if not state["sql_query"].strip():
+        return "convert_to_sql"
+    return "execute_sql"
+
 def check_attempts_router(state: AgentState):
     if state["attempts"] < 3:
         return "convert_to_sql"
     else:
         return "end_max_iterations"
 
+def validate_sql_router(state: AgentState):
+    if not state.get("sql_error", False):
+        return "execute_sql"
+    else:
+        return "regenerate_query"
+
+#a recovered candidate goes straight to execution, otherwise the attempts cap decides
+def recovery_router(state: AgentState):
+    if not state.get("sql_error", False):
+        return "execute_sql"
+    return check_attempts_router(state)
+
 def execute_sql_router(state: AgentState):
     if not state.get("sql_error", False):
-        return "generate_human_readable_answer"
+        return "condense_results"
     else:
         return "regenerate_query"
\ No newline at end of file
@@ -0,0 +1,98 @@
+#bounded LRU/TTL cache of question -> (relevance verdict, SQL) translations
+#keyed by the normalized question, the current user scope and the schema version
+#a hit lets the graph skip check_relevance and convert_nl_to_sql entirely
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+#the user id is part of the key because user-scoped SQL embeds it
+def translation_key(question, current_user, schema_version, current_user_id=None):
+    return f"{schema_version}|{current_user_id or ''}:{current_user or ''}|{normalize_question(question)}"
+
+
+class TranslationCache:
+
+    def __init__(self, max_entries=256, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   #key -> (stored_at, relevance, sql_query)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, relevance, sql_query = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return relevance, sql_query
+
+    def put(self, key, relevance, sql_query=""):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), relevance, sql_query)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    #drop one translation, e.g. cached SQL that failed when it was replayed
+    def discard(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+#shared by every graph run in this process
+translation_cache = TranslationCache(
+    max_entries=int(os.environ.get("TRANSLATION_CACHE_SIZE", "256")),
+    ttl=float(os.environ.get("TRANSLATION_CACHE_TTL", "3600")),
+)
+
+
+def translation_cache_stats():
+    return translation_cache.stats()
@@ -0,0 +1,118 @@
+#per-process cache of resolved users: current_user_id -> (id, name)
+#entries expire after USER_CACHE_TTL seconds and are dropped as soon as execute_sql writes to users
+#also serves the (bounded) user list for the Streamlit sidebar
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from sql_connection import ReadSessionLocal, User, get_engine
+
+
+#users offered in the sidebar list, larger databases switch to an ID input
+USER_LIST_LIMIT = int(os.environ.get("USER_LIST_LIMIT", "200"))
+
+
+@dataclass(frozen=True)
+class UserContext:
+    id: int
+    name: str
+
+
+class UserContextCache:
+
+    def __init__(self, ttl=300.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   #(database url, user id) -> (loaded_at, UserContext or None)
+        self._users = {}                #(database url, limit) -> (loaded_at, [UserContext, ...])
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _fresh(self, loaded_at):
+        return time.monotonic() - loaded_at < self.ttl
+
+    #None when the user does not exist (also cached, until the TTL or the next write to users)
+    def get(self, user_id):
+        key = (str(get_engine().url), int(user_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        session = ReadSessionLocal()
+        try:
+            user = session.query(User.id, User.name).filter(User.id == key[1]).first()
+        finally:
+            session.close()
+        context = UserContext(user.id, user.name) if user else None
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return context
+
+    #the first `limit` users by id
+    def list_users(self, limit=USER_LIST_LIMIT):
+        key = (str(get_engine().url), limit)
+        with self._lock:
+            cached = self._users.get(key)
+            if cached is not None and self._fresh(cached[0]):
+                return cached[1]
+        session = ReadSessionLocal()
+        try:
+            query = session.query(User.id, User.name).order_by(User.id).limit(limit)
+            users = [UserContext(user.id, user.name) for user in query]
+        finally:
+            session.close()
+        with self._lock:
+            self._users[key] = (time.monotonic(), users)
+        return users
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == int(user_id)]:
+                    del self._entries[key]
+            self._users.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+user_cache = UserContextCache(ttl=float(os.environ.get("USER_CACHE_TTL", "300")))
+
+
+def get_user_context(user_id):
+    return user_cache.get(user_id)
+
+
+def list_users(limit=USER_LIST_LIMIT):
+    return user_cache.list_users(limit)
+
+
+def invalidate_users(user_id=None):
+    user_cache.invalidate(user_id)
+
+
+def user_cache_stats():
+    return user_cache.stats()